@@ -21,6 +21,8 @@ from controllers.hr_r1_controller import hr_report_bp
 
 from controllers.emp_controller import employee_bp
 
+from controllers.api_controller import api_bp, sock
+
 app = Flask(__name__)               # Initialize Flask app
 app.config.from_object(Config)      # Load configuration from Config class
 init_db_connection(app)             # Initialize MongoDB connection
@@ -43,6 +45,9 @@ app.register_blueprint(hr_report_bp)
 
 app.register_blueprint(employee_bp)
 
+app.register_blueprint(api_bp)
+sock.init_app(app)                  # WebSocket routes (kiosk channel)
+
 
 
 
@@ -58,9 +63,11 @@ def inject_user():
 def require_login():
     from flask import request
     allowed_routes = ["auth.login", "auth.logout", "static"]
+    api_blueprints = ["api"]  # authenticated per request with an API key
 
     # if not logged in and route not in allowed list
-    if "user_id" not in session and request.endpoint not in allowed_routes:
+    if "user_id" not in session and request.endpoint not in allowed_routes \
+            and request.blueprint not in api_blueprints:
         return redirect(url_for("auth.login"))
     return None
 
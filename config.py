@@ -6,3 +6,23 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     MONGO_URI = os.getenv("MONGO_URI")
+
+    # Shared client of the recognition runtime (utils/db.get_runtime_db)
+    MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", 10))
+    MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 3000))
+
+    # Face detectors shared by Flask request threads (see utils/detector_pool.py).
+    # FACE_DETECTOR_CV_THREADS caps OpenCV's process-wide thread count; unset keeps
+    # OpenCV's default so the recognition micro-batcher's passes use every core.
+    FACE_DETECTOR_POOL_SIZE = int(os.getenv("FACE_DETECTOR_POOL_SIZE", os.cpu_count() or 1))
+    FACE_DETECTOR_CV_THREADS = int(os.getenv("FACE_DETECTOR_CV_THREADS", 0)) or None
+
+    # Kiosk / edge API (controllers/api_controller.py); comma-separated keys
+    API_KEYS = [k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()]
+
+    # Recognition API micro-batching (see utils/micro_batcher.py)
+    RECOGNITION_MAX_BATCH = int(os.getenv("RECOGNITION_MAX_BATCH", 16))
+    RECOGNITION_MAX_WAIT_MS = float(os.getenv("RECOGNITION_MAX_WAIT_MS", 5))
+
+    # Kiosk WebSocket channel (flask-sock / simple-websocket server options)
+    SOCK_SERVER_OPTIONS = {"ping_interval": 25, "max_message_size": 2 * 1024 * 1024}
@@ -0,0 +1,161 @@
+from flask import Blueprint, request, jsonify
+import json
+import time
+import cv2
+import numpy as np
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+from config import Config
+from utils.auth import api_key_required, has_valid_api_key
+from utils.db import mongo
+from utils.event_ingest import MAX_BATCH, ingest_events
+from utils.face_utils import FACE_DETECTORS, detect_faces_dnn, recognize_face_crops, recognize_frames
+from utils.micro_batcher import MicroBatcher
+from utils.tracker import FaceTracker, assign_identities
+
+api_bp = Blueprint("api", __name__, url_prefix="/api")
+sock = Sock()
+
+RECOGNIZE_TIMEOUT_SECONDS = 10
+
+# Kiosk sessions: a face must win KIOSK_MIN_VOTES of KIOSK_VOTE_WINDOW
+# predictions; a track survives KIOSK_TRACK_MAX_AGE_SECONDS without frames
+KIOSK_VOTE_WINDOW = 5
+KIOSK_MIN_VOTES = 3
+KIOSK_TRACK_MAX_AGE_SECONDS = 2.0
+
+# Frames from concurrent kiosk requests share one detection + LBPH pass
+RECOGNITION_BATCHER = MicroBatcher(
+    recognize_frames,
+    max_batch=Config.RECOGNITION_MAX_BATCH,
+    max_wait=Config.RECOGNITION_MAX_WAIT_MS / 1000.0,
+    name="recognition-batcher"
+)
+
+
+def _read_uploaded_frame():
+    """BGR frame from a multipart "image" field or a raw image request body."""
+    upload = request.files.get("image")
+    data = upload.read() if upload else request.get_data()
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+# ==========================================================
+# RECOGNIZE ONE FRAME
+# ==========================================================
+@api_bp.route("/recognize", methods=["POST"])
+@api_key_required
+def recognize():
+    start = time.perf_counter()
+    frame = _read_uploaded_frame()
+    if frame is None:
+        return jsonify({"error": "Send a JPEG/PNG frame as the body or as field \"image\"."}), 400
+
+    try:
+        faces = RECOGNITION_BATCHER.submit(frame, timeout=RECOGNIZE_TIMEOUT_SECONDS)
+    except Exception as e:
+        print("[API] Recognition failed:", e)
+        return jsonify({"error": "Recognition failed."}), 503
+
+    return jsonify({
+        "faces": [
+            {"box": [x, y, w, h], "user_id": uid, "name": name,
+             "distance": round(distance, 1) if distance is not None else None}
+            for (x, y, w, h, uid, name, distance) in faces
+        ],
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1)
+    })
+
+
+@api_bp.route("/recognize/stats")
+@api_key_required
+def recognize_stats():
+    return jsonify({
+        "batcher": RECOGNITION_BATCHER.stats(),
+        "detectors": FACE_DETECTORS.stats()
+    })
+
+
+# ==========================================================
+# KIOSK WEBSOCKET CHANNEL
+# ==========================================================
+@sock.route("/kiosk", bp=api_bp)
+def kiosk_channel(ws):
+    """
+    Persistent kiosk connection: binary JPEG frames in, one JSON message
+    per frame out:
+
+        {"frame": n, "faces": [{box, track, user_id, name, distance}],
+         "events": [{user_id, name}]}
+
+    A tracker lives for the whole connection, so "events" carries each
+    person once per visit instead of once per frame.
+    """
+    if not has_valid_api_key():
+        ws.send(json.dumps({"error": "Invalid or missing API key."}))
+        ws.close(reason=1008)
+        return
+
+    tracker = FaceTracker(max_age=KIOSK_TRACK_MAX_AGE_SECONDS,
+                          vote_window=KIOSK_VOTE_WINDOW, min_votes=KIOSK_MIN_VOTES)
+    frame_no = 0
+    try:
+        while True:
+            data = ws.receive()
+            if not isinstance(data, (bytes, bytearray)):
+                continue  # text messages are keep-alives
+
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                ws.send(json.dumps({"error": "Frame is not a valid image."}))
+                continue
+            frame_no += 1
+
+            def predict(box):
+                x, y, w, h = box
+                return recognize_face_crops([frame[y:y + h, x:x + w]])[0]
+
+            results, events = assign_identities(tracker, detect_faces_dnn(frame), predict)
+            ws.send(json.dumps({
+                "frame": frame_no,
+                "faces": [
+                    {"box": [x, y, w, h], "track": track_id, "user_id": uid, "name": name,
+                     "distance": round(distance, 1) if distance is not None else None}
+                    for (x, y, w, h, uid, name, distance, track_id) in results
+                ],
+                "events": [{"user_id": uid, "name": name} for uid, name, _ in events]
+            }))
+    except ConnectionClosed:
+        pass
+    print(f"[KIOSK] Session closed after {frame_no} frames, {tracker.created} tracks")
+
+
+# ==========================================================
+# EDGE EVENT INGESTION
+# ==========================================================
+@api_bp.route("/events", methods=["POST"])
+@api_key_required
+def ingest_attendance_events():
+    """
+    Batch of recognition events from an edge node:
+
+        {"events": [{"event_id", "user_id", "camera_id", "event_time", "confidence"}]}
+
+    Safe to retry: events already applied are reported as duplicates.
+    """
+    payload = request.get_json(silent=True) or {}
+    events = payload.get("events")
+    if not isinstance(events, list) or not events:
+        return jsonify({"error": "Body must be {\"events\": [...]}."}), 400
+    if len(events) > MAX_BATCH:
+        return jsonify({"error": f"At most {MAX_BATCH} events per batch."}), 413
+
+    try:
+        result = ingest_events(mongo.db, events)
+    except Exception as e:
+        print("[API] Event ingestion failed:", e)
+        return jsonify({"error": "Ingestion failed, retry the batch."}), 503
+
+    return jsonify(result)
@@ -1,11 +1,21 @@
-from flask import Blueprint, render_template, session, request, redirect, url_for, flash
+from flask import Blueprint, render_template, session, request, redirect, url_for, flash, jsonify
 from datetime import datetime
+import cv2
+import numpy as np
 from bson import ObjectId
 from utils.db import mongo
 from utils.auth import login_required
+from utils.attendance_rules import bulk_mark_attendance
+from utils.face_utils import detect_faces_dnn_batch, recognize_face_crops
+from utils.sightings import record_sightings_safely, sighting_doc
 
 hr_attendance_bp = Blueprint("hr_attendance", __name__, url_prefix="/hr/attendance")
 
+MAX_GROUP_PHOTOS = 10
+# Longest side of the detector input for group photos; the default 300x300
+# loses the small faces at the back of a classroom
+GROUP_PHOTO_MAX_INPUT = 1024
+
 
 # ==========================================================
 # VIEW ATTENDANCE DASHBOARD
@@ -132,3 +142,120 @@ def add_out_time():
         flash("Invalid entry index.", "danger")
 
     return redirect(url_for("hr_attendance.view_attendance"))
+
+
+# ==========================================================
+# GROUP PHOTO → BULK ATTENDANCE
+# ==========================================================
+def _group_photo_input_size(frame):
+    """Detector input with the photo's aspect ratio, longest side at most
+    GROUP_PHOTO_MAX_INPUT, in multiples of 32."""
+    h, w = frame.shape[:2]
+    scale = min(1.0, GROUP_PHOTO_MAX_INPUT / max(h, w))
+    return max(32, int(w * scale) // 32 * 32), max(32, int(h * scale) // 32 * 32)
+
+
+@hr_attendance_bp.route("/group_photo", methods=["POST"])
+@login_required
+def mark_from_group_photo():
+    """
+    Mark attendance for everyone recognized in one or more uploaded photos
+    (form field "images"). Faces are detected at up to GROUP_PHOTO_MAX_INPUT
+    pixels (one batched DNN pass per photo size), recognized in one pass,
+    and the matched users of this HR's institute are marked with a single
+    bulk write.
+    """
+    try:
+        hr_doc = mongo.db.users.find_one({"_id": ObjectId(session.get("user_id"))})
+    except Exception:
+        hr_doc = None
+    if not hr_doc or not hr_doc.get("institute_id"):
+        return jsonify({"error": "No institute assigned to this user."}), 400
+    institute_id = str(hr_doc["institute_id"])
+
+    uploads = request.files.getlist("images")
+    if not uploads:
+        return jsonify({"error": "No images uploaded."}), 400
+    if len(uploads) > MAX_GROUP_PHOTOS:
+        return jsonify({"error": f"At most {MAX_GROUP_PHOTOS} images per request."}), 400
+
+    # ---------------------------
+    # DECODE + DETECT (one batch)
+    # ---------------------------
+    images, names, unreadable = [], [], []
+    for upload in uploads:
+        frame = cv2.imdecode(np.frombuffer(upload.read(), np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            unreadable.append(upload.filename)
+            continue
+        images.append(frame)
+        names.append(upload.filename)
+
+    by_size = {}
+    for i, frame in enumerate(images):
+        by_size.setdefault(_group_photo_input_size(frame), []).append(i)
+    detections = [None] * len(images)
+    for size, indexes in by_size.items():
+        found = detect_faces_dnn_batch([images[i] for i in indexes], input_size=size)
+        for i, faces in zip(indexes, found):
+            detections[i] = faces
+
+    crops, boxes = [], []
+    for image_name, frame, faces in zip(names, images, detections):
+        for (x, y, w, h, conf) in faces:
+            crops.append(frame[y:y + h, x:x + w])
+            boxes.append({"image": image_name, "box": [x, y, w, h]})
+
+    # ---------------------------
+    # RECOGNIZE (one pass)
+    # ---------------------------
+    matched, unknown, seen = [], [], {}
+    for face, (uid, name, distance) in zip(boxes, recognize_face_crops(crops)):
+        face["distance"] = round(distance, 1) if distance is not None else None
+        if uid:
+            face.update(user_id=uid, name=name)
+            seen.setdefault(uid, []).append(face)
+        else:
+            unknown.append(face)
+
+    # Only users of this institute; anyone else counts as unknown
+    valid_ids = [ObjectId(uid) for uid in seen if ObjectId.is_valid(uid)]
+    users = {
+        str(u["_id"]): u for u in mongo.db.users.find(
+            {"_id": {"$in": valid_ids}}, {"name": 1, "institute_id": 1}
+        )
+        if str(u.get("institute_id")) == institute_id
+    }
+    for uid in list(seen):
+        if uid not in users:
+            for face in seen.pop(uid):
+                face.pop("user_id")
+                face.pop("name")
+                unknown.append(face)
+
+    # ---------------------------
+    # MARK (one bulk write)
+    # ---------------------------
+    event_time = datetime.now().astimezone()
+    actions = bulk_mark_attendance(
+        mongo.db.attendances, [(uid, institute_id, event_time) for uid in seen]
+    )
+    record_sightings_safely(mongo.db, [
+        sighting_doc(uid, "group_photo", event_time, min(f["distance"] for f in faces), source="upload")
+        for uid, faces in seen.items()
+    ])
+    for uid, action in zip(seen, actions):
+        matched.append({
+            "user_id": uid,
+            "name": users[uid].get("name", seen[uid][0]["name"]),
+            "action": action,
+            "faces": seen[uid]
+        })
+
+    return jsonify({
+        "images": len(images),
+        "faces": len(boxes),
+        "matched": matched,
+        "unknown": unknown,
+        "unreadable": unreadable
+    })
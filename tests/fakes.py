@@ -0,0 +1,78 @@
+"""
+In-memory stand-ins for the few pymongo collection / database calls the
+attendance writers make. bulk_write only records its ops (the pipeline
+updates run on the server); tests set the stored documents themselves.
+"""
+
+from collections import Counter
+
+
+def _matches(doc, query):
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict) and "$in" in cond:
+            if doc.get(field) not in cond["$in"]:
+                return False
+        elif isinstance(cond, dict) and "$lt" in cond:
+            if doc.get(field) is None or not doc[field] < cond["$lt"]:
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+class FakeCollection:
+    def __init__(self, name, database, docs=()):
+        self.name = name
+        self.database = database
+        self.docs = [dict(d) for d in docs]
+        self.calls = Counter()
+        self.bulk_ops = []
+
+    def create_index(self, *args, **kwargs):
+        self.calls["create_index"] += 1
+
+    def find(self, query=None, projection=None):
+        self.calls["find"] += 1
+        return [dict(d) for d in self.docs if _matches(d, query or {})]
+
+    def insert_many(self, docs, ordered=True):
+        self.calls["insert_many"] += 1
+        self.docs.extend(dict(d) for d in docs)
+
+    def update_many(self, query, update):
+        self.calls["update_many"] += 1
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update.get("$set", {}))
+                for field in update.get("$unset", {}):
+                    doc.pop(field, None)
+
+    def delete_many(self, query):
+        self.calls["delete_many"] += 1
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls["bulk_write"] += 1
+        self.bulk_ops.append(list(ops))
+
+
+class FakeDatabase:
+    def __init__(self, name="facetrack_test"):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name, self)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def create_collection(self, name, **kwargs):
+        return self[name]
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("bson")
+
+from fakes import FakeDatabase  # noqa: E402
+from utils.attendance_cache import AttendanceStateCache  # noqa: E402
+from utils.attendance_rules import IST  # noqa: E402
+from utils.attendance_writer import AttendanceWriter  # noqa: E402
+
+ALICE = "65a1f0c2e4b0a1b2c3d4e5f6"
+
+
+def _at(hour, minute):
+    return datetime(2026, 10, 17, hour, minute, tzinfo=IST)
+
+
+def test_repeat_after_db_answered_miss_is_served_from_cache():
+    # Checked in at 09:00 by another process (or before a restart)
+    db = FakeDatabase()
+    db.attendances.docs = [{"user_id": ALICE, "date": "2026-10-17", "entries": [
+        {"time_in": "09:00", "time_out": None, "duration": None, "label": "Check-In"}]}]
+    cache = AttendanceStateCache()
+    writer = AttendanceWriter(lambda: db, on_days=cache.remember_days)
+
+    assert cache.check(ALICE, _at(9, 2)) is None
+    writer._flush([(ALICE, "Alice", _at(9, 2), "gate-1", 41.0, "inst-1", False)])
+    assert writer.stats()["actions"] == {"Already Present": 1}
+
+    assert cache.check(ALICE, _at(9, 3)) == "Already Present (3m)"
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_misses_once_the_window_has_passed():
+    cache = AttendanceStateCache()
+    cache.remember_days({(ALICE, "2026-10-17"): [
+        {"time_in": "09:00", "time_out": None, "duration": None, "label": "Check-In"}]})
+
+    assert cache.check(ALICE, _at(9, 4)) == "Already Present (4m)"
+    assert cache.check(ALICE, _at(9, 5)) is None
+    # Late events go to the DB, which rejects them as out of order
+    assert cache.check(ALICE, _at(8, 59)) is None
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("bson")
+
+from fakes import FakeDatabase  # noqa: E402
+from utils.attendance_rules import IST  # noqa: E402
+from utils.attendance_writer import AttendanceWriter  # noqa: E402
+
+
+def _events(n):
+    start = datetime(2026, 10, 17, 9, 0, tzinfo=IST)
+    return [(f"65a1f0c2e4b0a1b2c3d4{i:04x}", f"user {i}", start + timedelta(seconds=i), "gate-1",
+             42.0, "inst-1", False) for i in range(n)]
+
+
+def test_flush_is_one_read_and_one_bulk_write():
+    db = FakeDatabase()
+    writer = AttendanceWriter(lambda: db, max_batch=100)
+
+    writer._flush(_events(100))
+
+    assert db.attendances.calls["bulk_write"] == 1
+    assert db.attendances.calls["find"] <= 2
+    assert len(db.attendances.bulk_ops[0]) == 100
+    assert writer.stats()["written"] == 100
+    assert writer.stats()["actions"] == {"Check-In": 100}
+
+
+def test_sighting_only_events_are_not_marked():
+    db = FakeDatabase()
+    writer = AttendanceWriter(lambda: db)
+    events = _events(2)
+    events[1] = events[1][:6] + (True,)
+
+    writer._flush(events)
+
+    assert len(db.attendances.bulk_ops[0]) == 1
+    assert len(db.sightings.docs) == 2
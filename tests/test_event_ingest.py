@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("pymongo")
+bson = pytest.importorskip("bson")
+
+from fakes import FakeDatabase  # noqa: E402
+from utils.event_ingest import ingest_events  # noqa: E402
+
+ALICE = "65a1f0c2e4b0a1b2c3d4e5f6"
+BOB = "65a1f0c2e4b0a1b2c3d4e5f7"
+
+
+def _db():
+    db = FakeDatabase()
+    db.users.docs = [{"_id": bson.ObjectId(uid), "institute_id": "inst-1"} for uid in (ALICE, BOB)]
+    return db
+
+
+def _event(event_id, user_id, time):
+    return {"event_id": event_id, "user_id": user_id, "camera_id": "gate-1",
+            "event_time": f"2026-10-17T{time}:00+05:30", "confidence": 0.91}
+
+
+def test_claimed_batch_is_applied_with_one_bulk_write():
+    db = _db()
+    batch = [_event("e1", ALICE, "09:00"), _event("e2", BOB, "09:01"), _event("e3", ALICE, "09:30")]
+
+    result = ingest_events(db, batch)
+
+    assert [r["event_id"] for r in result["results"]] == ["e1", "e2", "e3"]
+    assert db.attendances.calls["bulk_write"] == 1
+    assert len(db.attendances.bulk_ops[0]) == 3
+    assert all(d["applied"] and "claim" not in d for d in db.attendance_events.docs)
+
+
+def test_resent_batch_is_not_written_again():
+    db = _db()
+    batch = [_event("e1", ALICE, "09:00"), _event("e2", BOB, "09:01")]
+    ingest_events(db, batch)
+
+    result = ingest_events(db, batch)
+
+    assert result["results"] == []
+    assert result["duplicates"] == ["e1", "e2"]
+    assert db.attendances.calls["bulk_write"] == 1
+
+
+def test_events_claimed_by_another_request_are_duplicates():
+    db = _db()
+    ingest_events(db, [_event("e1", ALICE, "09:00")])
+    # Simulate a first request still in flight for e2
+    db.attendance_events.docs.append({"_id": "e2", "applied": False, "claim": "other-request",
+                                      "claimed_at": db.attendance_events.docs[0]["received_at"]})
+
+    result = ingest_events(db, [_event("e2", BOB, "09:01")])
+
+    assert result["results"] == []
+    assert result["duplicates"] == ["e2"]
+    assert db.attendances.calls["bulk_write"] == 1
+
+
+def test_confidence_is_kept_apart_from_distance():
+    db = _db()
+    ingest_events(db, [_event("e1", ALICE, "09:00")])
+
+    sighting, = db.sightings.docs
+    assert sighting["confidence"] == 0.91
+    assert sighting["distance"] is None
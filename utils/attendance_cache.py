@@ -0,0 +1,83 @@
+"""
+utils/attendance_cache.py
+-------------------------
+Per-user attendance state kept in the recognition process.
+
+For each (user_id, date) the cache remembers the time of the user's last
+check-in or check-out and whether that entry is still open. Any sighting
+within MIN_DURATION_MINUTES of that time is a repeat under the rules in
+utils/attendance_rules.py, so it can be answered here without a database
+round-trip. Misses (first sighting of the day, a new date, or an expired
+window) go to MongoDB as before.
+
+Only state confirmed by the database is stored: the day's entries as
+read back after each batch write (remember_days), including misses the
+database answered as repeats, so after a restart, or a check-in made by
+another process, the next repeats are answered here. Another camera or
+process can only move the real last transition later, so a repeat
+answered from the cache is always a repeat in the database too.
+"""
+
+import threading
+
+from utils.attendance_rules import IST, MIN_DURATION_MINUTES, _minutes_between
+
+
+class AttendanceStateCache:
+    def __init__(self, min_minutes=MIN_DURATION_MINUTES):
+        self.min_minutes = min_minutes
+        self.hits = 0
+        self.misses = 0
+
+        self._state = {}   # (user_id, date) -> (last "HH:MM", entry still open)
+        self._date = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key_time(user_id, event_time):
+        local = event_time.astimezone(IST)
+        return (str(user_id), local.strftime("%Y-%m-%d")), local.strftime("%H:%M")
+
+    def _roll_over(self, date):
+        # Only today's states are useful; drop the rest on the first event of a new day
+        if date != self._date:
+            self._state = {k: v for k, v in self._state.items() if k[1] >= date}
+            self._date = date
+
+    def check(self, user_id, event_time):
+        """"Already Present (Nm)" if this sighting is a known repeat, else None (ask the DB)."""
+        key, current = self._key_time(user_id, event_time)
+        with self._lock:
+            self._roll_over(key[1])
+            state = self._state.get(key)
+            if state is not None:
+                diff = _minutes_between(state[0], current)
+                # Late (older) events go to the DB, which rejects them as out of order
+                if 0 <= diff < self.min_minutes:
+                    self.hits += 1
+                    return f"Already Present ({diff}m)"
+            self.misses += 1
+            return None
+
+    def remember_entries(self, user_id, date, entries):
+        """Store the state implied by a day's entries as read from / written to the DB."""
+        if not entries:
+            return
+        last = entries[-1]
+        is_open = last.get("time_out") is None
+        with self._lock:
+            self._state[(str(user_id), date)] = (last["time_in"] if is_open else last["time_out"], is_open)
+
+    def remember_days(self, days):
+        """remember_entries() for {(user_id, date): entries} (bulk_mark_attendance return_days)."""
+        for (user_id, date), entries in days.items():
+            self.remember_entries(user_id, date, entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "users": len(self._state),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,343 @@
+"""
+utils/attendance_rules.py
+-------------------------
+Check-in / check-out rules for the attendances collection, shared by the
+live recognition loop (utils/mark_attendance.py) and bulk marking from
+the HR screens.
+
+One document per (user_id, date):
+    entries: [{time_in, time_out, duration, label}, ...]
+
+A sighting opens an entry, the next sighting at least MIN_DURATION_MINUTES
+later closes it, and sightings in between are repeats. A document only
+covers its own date, so a sighting earlier than the day's last check-in /
+check-out arrived late (edge retry, recording, replay) and is rejected as
+"Out of Order"; it is still kept in sightings for recompute_attendance().
+
+Merge duplicate days left by versions before the unique index:
+
+    python -m utils.attendance_rules --merge-duplicates
+"""
+
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from utils.log import get_logger
+
+MIN_DURATION_MINUTES = 5
+MARKED_BY = "LBPH System"
+DUPLICATE_KEY = 11000
+
+log = get_logger("attendance")
+
+# Proper timezone-aware IST
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+# ============================
+# UTILITIES
+# ============================
+def _parse_time_str(tstr):
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(tstr, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Bad time: {tstr}")
+
+
+def _minutes_between(t1, t2):
+    """Signed minutes from t1 to t2, both times of the same date (negative if t2 is earlier)."""
+    d1 = _parse_time_str(t1)
+    d2 = _parse_time_str(t2)
+    return int((d2 - d1).total_seconds() // 60)
+
+
+def _format_dur(m):
+    h, mm = divmod(int(m), 60)
+    return f"{h}h {mm}m"
+
+
+def _check_in(current_time):
+    return {
+        "time_in": current_time,
+        "time_out": None,
+        "duration": None,
+        "label": "Check-In"
+    }
+
+
+# ============================
+# RULES
+# ============================
+def apply_attendance_event(entries, current_time):
+    """
+    Apply one sighting at current_time ("HH:MM") to a day's entries.
+    Returns (action, new_entries); new_entries is None when nothing changes.
+    """
+    entries = [dict(e) for e in entries]
+    last = entries[-1] if entries else None
+
+    if not last:
+        entries.append(_check_in(current_time))
+        return "Check-In", entries
+
+    is_open = last.get("time_out") is None
+    diff = _minutes_between(last["time_in"] if is_open else last["time_out"], current_time)
+
+    # Older than the last transition → arrived late, never reorders the day
+    if diff < 0:
+        return f"Out of Order ({-diff}m late)", None
+    if diff < MIN_DURATION_MINUTES:
+        return f"Already Present ({diff}m)", None
+
+    # Last entry has no time_out → CHECK-OUT
+    if is_open:
+        last["time_out"] = current_time
+        last["duration"] = _format_dur(diff)
+        last["label"] = "Check-Out"
+        return "Check-Out", entries
+
+    # Last entry closed → NEW CHECK-IN
+
+    entries.append(_check_in(current_time))
+    return "Check-In", entries
+
+
+# ============================
+# ATOMIC (PIPELINE) UPDATE
+# ============================
+_indexed = set()
+_index_lock = threading.Lock()
+
+
+def _merge_entries(entries):
+    """
+    Entries of several documents for one day, in time order; one entry per
+    check-in time, preferring the copy that was checked out.
+    """
+    by_time_in = {}
+    for e in entries:
+        kept = by_time_in.get(e["time_in"])
+        if kept is None or (e.get("time_out") and not kept.get("time_out")):
+            by_time_in[e["time_in"]] = e
+    return sorted(by_time_in.values(), key=lambda e: _parse_time_str(e["time_in"]))
+
+
+def merge_duplicate_days(collection):
+    """
+    Fold duplicate (user_id, date) documents (written before the unique
+    index existed) into the oldest one. Returns the number removed.
+    """
+    removed = 0
+    duplicates = collection.aggregate([
+        {"$group": {"_id": {"user_id": "$user_id", "date": "$date"},
+                    "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    for dup in duplicates:
+        docs = list(collection.find({"_id": {"$in": dup["ids"]}}).sort("_id", 1))
+        keep, extra = docs[0], docs[1:]
+        collection.update_one({"_id": keep["_id"]}, {"$set": {
+            "entries": _merge_entries([e for d in docs for e in d.get("entries", [])]),
+            "updated_at": datetime.now(IST),
+        }})
+        collection.delete_many({"_id": {"$in": [d["_id"] for d in extra]}})
+        removed += len(extra)
+    return removed
+
+
+def ensure_attendance_indexes(collection):
+    """
+    Unique (user_id, date) index, created once per process and database.
+    Failures are raised, since the atomic upserts rely on this index.
+    Duplicate days left by older versions are never merged here; run the
+    migration first:
+
+        python -m utils.attendance_rules --merge-duplicates
+    """
+    key = (collection.database.name, collection.name)
+    with _index_lock:
+        if key in _indexed:
+            return
+        try:
+            collection.create_index([("user_id", 1), ("date", 1)], unique=True, name="user_date_unique")
+        except OperationFailure as e:
+            hint = "run python -m utils.attendance_rules --merge-duplicates" if e.code == DUPLICATE_KEY else None
+            log.error("attendance_index_failed", collection=collection.name, code=e.code,
+                      error=str(e), hint=hint)
+            raise
+        _indexed.add(key)
+
+
+def _minutes_of(expr):
+    """Server-side minutes since midnight of an "HH:MM[:SS]" string."""
+    t = {"$ifNull": [expr, "00:00"]}
+    return {"$add": [{"$multiply": [{"$toInt": {"$substrCP": [t, 0, 2]}}, 60]},
+                     {"$toInt": {"$substrCP": [t, 3, 2]}}]}
+
+
+def attendance_update_pipeline(current_time, institute_id, now_ist):
+    """
+    Aggregation-pipeline update applying apply_attendance_event() on the
+    server, so a day's document is read and written in one atomic step.
+    Works on an upserted (empty) document too.
+    """
+    cur = _minutes_of(current_time)
+    has_last = {"$gt": [{"$size": "$_e"}, 0]}
+    duration = {"$concat": [{"$toString": {"$toInt": {"$floor": {"$divide": ["$_diff", 60]}}}}, "h ",
+                            {"$toString": {"$mod": ["$_diff", 60]}}, "m"]}
+    check_in = {"$literal": _check_in(current_time)}
+
+    return [
+        {"$set": {"_e": {"$ifNull": ["$entries", []]}}},
+        {"$set": {"_last": {"$arrayElemAt": ["$_e", -1]}}},
+        {"$set": {
+            "_open": {"$and": [has_last, {"$eq": [{"$ifNull": ["$_last.time_out", None]}, None]}]},
+            # Same date, so no midnight wrap; negative = late event (left untouched)
+            "_diff": {"$cond": [has_last,
+                                {"$subtract": [cur, _minutes_of(
+                                    {"$ifNull": ["$_last.time_out", "$_last.time_in"]})]},
+                                None]},
+        }},
+        {"$set": {
+            "_changed": {"$or": [{"$not": [has_last]}, {"$gte": ["$_diff", MIN_DURATION_MINUTES]}]},
+            "entries": {"$switch": {
+                "branches": [
+                    {"case": {"$not": [has_last]}, "then": [check_in]},
+                    # Repeats and out-of-order events (_diff < 0) change nothing
+                    {"case": {"$lt": ["$_diff", MIN_DURATION_MINUTES]}, "then": "$_e"},
+                    {"case": "$_open", "then": {"$concatArrays": [
+                        {"$slice": ["$_e", {"$subtract": [{"$size": "$_e"}, 1]}]},
+                        [{"$mergeObjects": ["$_last", {"time_out": current_time,
+                                                       "duration": duration,
+                                                       "label": "Check-Out"}]}]
+                    ]}},
+                ],
+                "default": {"$concatArrays": ["$_e", [check_in]]}
+            }},
+        }},
+        {"$set": {
+            "updated_at": {"$cond": ["$_changed", now_ist, "$updated_at"]},
+            "created_at": {"$ifNull": ["$created_at", now_ist]},
+            "institute_id": {"$ifNull": ["$institute_id", institute_id]},
+            "status": {"$ifNull": ["$status", "present"]},
+            "marked_by": {"$ifNull": ["$marked_by", MARKED_BY]},
+        }},
+        {"$unset": ["_e", "_last", "_open", "_diff", "_changed"]},
+    ]
+
+
+def _day_filter_and_update(user_id, institute_id, now_ist):
+    current_time = now_ist.strftime("%H:%M")
+    flt = {"user_id": str(user_id), "date": now_ist.strftime("%Y-%m-%d")}
+    return flt, attendance_update_pipeline(current_time, str(institute_id or ""), now_ist), current_time
+
+
+# ============================
+# BULK MARKING
+# ============================
+def _read_days(collection, keys):
+    """{(user_id, date): entries} for the existing documents among `keys`."""
+    if not keys:
+        return {}
+    return {(d["user_id"], d["date"]): d.get("entries", [])
+            for d in collection.find({"$or": [{"user_id": u, "date": d} for u, d in keys]},
+                                     {"user_id": 1, "date": 1, "entries": 1})}
+
+
+def _bulk_write_upserts(collection, ops):
+    """
+    Ordered bulk_write of day upserts. Two writers creating the same new
+    day race on the unique index; the loser's batch stops at that op
+    (E11000) and is resumed from it, which now updates the existing day.
+    """
+    start, retried = 0, None
+    while start < len(ops):
+        try:
+            collection.bulk_write(ops[start:], ordered=True)
+            return
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if not errors or errors[0].get("code") != DUPLICATE_KEY:
+                raise
+            failed = start + errors[0]["index"]
+            if failed == retried:  # a second E11000 on the same op is not a race
+                raise
+            start = retried = failed
+
+
+def bulk_mark_attendance(collection, events, return_days=False):
+    """
+    Mark many sightings (journal replay, async writer, edge ingest, group
+    photos) with one read and one ordered bulk_write.
+
+    events: (user_id, institute_id, event_time) tuples; event_time is an
+            aware datetime (None = now).
+    Returns the action for each event, in input order. With return_days,
+    (actions, {(user_id, date): entries}) with the entries read back after
+    the write.
+
+    Every event is sent as the atomic pipeline update above, so the server
+    applies the rules to whatever the document holds at that moment and a
+    concurrent writer can never corrupt or duplicate a day. The actions
+    are worked out from the read before the write and are labels: with a
+    concurrent writer one may differ from what the server did. Cached
+    state (utils/attendance_cache.py) comes from the entries read back.
+    """
+    prepared = [(str(user_id), str(institute_id or ""),
+                 event_time.astimezone(IST) if event_time else datetime.now(IST))
+                for user_id, institute_id, event_time in events]
+    if not prepared:
+        return ([], {}) if return_days else []
+
+    ensure_attendance_indexes(collection)
+    keys = {(uid, t.strftime("%Y-%m-%d")) for uid, _, t in prepared}
+    entries_by_day = _read_days(collection, keys)
+
+    ops = []
+    actions = [None] * len(prepared)
+    for i in sorted(range(len(prepared)), key=lambda i: prepared[i][2]):
+        uid, institute_id, now_ist = prepared[i]
+        key = (uid, now_ist.strftime("%Y-%m-%d"))
+        actions[i], entries = apply_attendance_event(entries_by_day.get(key, []),
+                                                     now_ist.strftime("%H:%M"))
+        if entries is not None:
+            entries_by_day[key] = entries
+        flt, pipeline, _ = _day_filter_and_update(uid, institute_id, now_ist)
+        ops.append(UpdateOne(flt, pipeline, upsert=True))
+
+    # Ordered, so several events for one day are applied in time order
+    _bulk_write_upserts(collection, ops)
+    if return_days:
+        return actions, _read_days(collection, keys)
+    return actions
+
+
+__all__ = [
+    "IST",
+    "MIN_DURATION_MINUTES",
+    "apply_attendance_event",
+    "ensure_attendance_indexes",
+    "merge_duplicate_days",
+    "attendance_update_pipeline",
+    "bulk_mark_attendance",
+]
+
+
+if __name__ == "__main__":
+    from utils.db import get_runtime_db
+
+    parser = argparse.ArgumentParser(description="Attendance collection migrations")
+    parser.add_argument("--merge-duplicates", action="store_true", required=True,
+                        help="merge duplicate (user_id, date) documents, then create the unique index")
+    args = parser.parse_args()
+
+    attendances = get_runtime_db().attendances
+    removed = merge_duplicate_days(attendances)
+    ensure_attendance_indexes(attendances)
+    print(f"[MIGRATE] {removed} duplicate attendance document(s) merged; unique index in place")
@@ -0,0 +1,186 @@
+"""
+utils/attendance_writer.py
+--------------------------
+Asynchronous, batched attendance writer for the recognition runtime.
+
+Callers submit() events and return immediately. A writer thread
+collects them until `max_batch` events are queued or the oldest has
+waited `max_delay_ms`, then writes the whole batch through one shared
+pooled client (utils/db.get_runtime_db):
+
+    one users lookup (only for events without institute_id)
+    one read + one ordered bulk_write on attendances (utils/attendance_rules)
+    one insert_many on sightings   (utils/sightings; best effort, a
+                                    sightings failure never fails the batch)
+
+Events submitted with sighting_only=True (repeats the caller already
+answered from its cache) are only kept as sightings.
+
+A failed flush is retried with backoff; events are never reordered.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from bson import ObjectId
+
+from utils.attendance_rules import IST, bulk_mark_attendance
+from utils.log import get_logger
+from utils.sightings import record_sightings_safely, sighting_backlog, sighting_doc
+
+log = get_logger("writer")
+
+
+def apply_attendance_batch(db, events):
+    """
+    Write (user_id, user_name, event_time, camera_id, distance, institute_id,
+    sighting_only) events. Returns (actions, days): one action per event
+    ("Error" for unknown users, None for sighting-only events) and the
+    {(user_id, date): entries} of the marked days as read back after the
+    write, for the attendance cache.
+    Raises on database errors so the caller can retry.
+    """
+    institutes = {e[0]: e[5] for e in events if e[5] is not None}
+    missing = {e[0] for e in events if e[0] not in institutes and ObjectId.is_valid(e[0])}
+    if missing:
+        for u in db.users.find({"_id": {"$in": [ObjectId(i) for i in missing]}}, {"institute_id": 1}):
+            institutes[str(u["_id"])] = str(u.get("institute_id", ""))
+
+    known = [i for i, e in enumerate(events) if e[0] in institutes]
+    for e in events:
+        if e[0] not in institutes:
+            log.error("user_not_found", user_id=e[0], key=("user_not_found", e[0]), every=60)
+
+    marked = [i for i in known if not events[i][6]]
+    applied, days = bulk_mark_attendance(db.attendances, [
+        (events[i][0], institutes[events[i][0]], events[i][2]) for i in marked
+    ], return_days=True)
+    record_sightings_safely(db, [
+        sighting_doc(events[i][0], events[i][3], events[i][2], events[i][4]) for i in known
+    ])
+
+    actions = [None if e[6] else "Error" for e in events]
+    for i, action in zip(marked, applied):
+        actions[i] = action
+    return actions, days
+
+
+class AttendanceWriter:
+    def __init__(self, get_db, max_batch=100, max_delay_ms=200, queue_size=10000,
+                 on_days=None, backoff_min=0.5, backoff_max=30.0):
+        """
+        get_db()   – database handle (shared pooled client)
+        on_days    – optional callback({(user_id, date): entries}) after each
+                     flush, with the days as stored (AttendanceStateCache.remember_days)
+        """
+        self.get_db = get_db
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.on_days = on_days
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failures = 0
+        self.dropped = 0
+        self.actions = Counter()
+        self._flush_ms = deque(maxlen=512)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, user_id, user_name, event_time=None, camera_id=None, distance=None,
+               institute_id=None, sighting_only=False):
+        """Queue one event; never blocks (drops and counts if the queue is full)."""
+        event = (str(user_id), user_name, event_time or datetime.now(IST), camera_id, distance,
+                 institute_id, sighting_only)
+        try:
+            self._queue.put_nowait(event)
+            self.submitted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        actions, days = apply_attendance_batch(self.get_db(), batch)
+        self._flush_ms.append((time.perf_counter() - started) * 1000)
+
+        self.written += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for action in actions:
+            self.actions["Sighting" if action is None else action.split(" (")[0]] += 1
+        if self.on_days is not None:
+            self.on_days(days)
+
+    def _run(self):
+        backoff = self.backoff_min
+        # Keep draining after stop() so queued events are written before exit
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            while batch:
+                try:
+                    self._flush(batch)
+                    backoff = self.backoff_min
+                    break
+                except Exception as e:
+                    self.failures += 1
+                    log.warning("flush_failed", events=len(batch), error=e, retry_in=round(backoff, 1),
+                                key="flush_failed", every=30)
+                    if self._stop.wait(backoff):
+                        log.error("events_not_written", events=len(batch))
+                        return
+                    backoff = min(self.backoff_max, backoff * 2)
+
+    def close(self, timeout=10.0):
+        """Flush what is queued and stop the thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        flush_ms = sorted(self._flush_ms)
+        return {
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "flush_ms_p50": round(flush_ms[len(flush_ms) // 2], 1) if flush_ms else None,
+            "flush_ms_max": round(flush_ms[-1], 1) if flush_ms else None,
+            "actions": dict(self.actions),
+            "sighting_backlog": sighting_backlog()[0],
+        }
@@ -1,5 +1,6 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash
+import hmac
+from flask import session, redirect, url_for, flash, request, jsonify, current_app
 
 # This decorator makes sure that only logged-in users can access protected pages
 def login_required(view_function):
@@ -13,6 +14,22 @@ def login_required(view_function):
     return decorated_function
 
 
+# Machine clients (kiosks, edge nodes) send an API key instead of a session.
+# Browsers can't set headers on a WebSocket, so "?api_key=" is accepted too.
+def has_valid_api_key():
+    key = request.headers.get("X-API-Key") or request.args.get("api_key", "")
+    return any(hmac.compare_digest(key.encode(), k.encode()) for k in current_app.config.get("API_KEYS", []))
+
+
+def api_key_required(view_function):
+    @wraps(view_function)
+    def decorated_function(*args, **kwargs):
+        if not has_valid_api_key():
+            return jsonify({"error": "Invalid or missing API key."}), 401
+        return view_function(*args, **kwargs)
+    return decorated_function
+
+
 # Optional helper function — you can call this to check login state in other routes
 def is_logged_in():
     return "user_id" in session
@@ -0,0 +1,82 @@
+"""
+utils/bench_alloc.py
+--------------------
+Allocation report for the recognition hot loop (FrameProcessor), with and
+without buffer reuse, measured with tracemalloc. No camera or database
+is needed: frames come from a video file or static/dataset and are
+"read" into a buffer the way cap.read() / cap.read(dst) would.
+
+For every frame it records the peak of newly allocated Python/NumPy
+memory (tracemalloc.reset_peak) and prints the mean, the p95 and how much
+memory the loop kept after all frames.
+
+    python -m utils.bench_alloc [--video gate.mp4] [--frames 300]
+"""
+
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from utils.bench_detect_batch import load_frames
+from utils.mark_attendance import FrameProcessor, load_recognizer, new_tracker
+from utils.pipeline import FrameBufferPool
+
+WARMUP_FRAMES = 20
+
+
+def run(frames, n_frames, reuse, recognizer, directory):
+    processor = FrameProcessor(recognizer, directory, tracker=new_tracker(), reuse_buffers=reuse)
+    pool = FrameBufferPool() if reuse else None
+
+    def step(src):
+        if pool is not None:
+            frame = pool.acquire(src.shape)
+            np.copyto(frame, src)          # cap.read(frame)
+        else:
+            frame = src.copy()             # cap.read() → new array
+        processor(frame)
+        if pool is not None:
+            pool.release(frame)
+
+    for i in range(WARMUP_FRAMES):
+        step(frames[i % len(frames)])
+
+    tracemalloc.start()
+    start_current = tracemalloc.get_traced_memory()[0]
+    per_frame = []
+    for i in range(n_frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        step(frames[i % len(frames)])
+        per_frame.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - start_current
+    tracemalloc.stop()
+
+    per_frame.sort()
+    return {
+        "mean_kib": sum(per_frame) / len(per_frame) / 1024,
+        "p95_kib": per_frame[int(0.95 * (len(per_frame) - 1))] / 1024,
+        "retained_kib": retained / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="video file to sample frames from")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    # A benchmark only maps labels to users; no background user sync
+    recognizer, directory = load_recognizer(sync_users=False)
+    if recognizer is None:
+        raise SystemExit(1)
+    frames = load_frames(args.video, limit=64)
+    if not frames:
+        raise SystemExit("[ERROR] No frames to benchmark.")
+
+    print(f"{'mode':>10} | {'mean KiB/frame':>14} | {'p95 KiB/frame':>13} | {'retained KiB':>12}")
+    for reuse in (False, True):
+        r = run(frames, args.frames, reuse, recognizer, directory)
+        mode = "reuse" if reuse else "allocate"
+        print(f"{mode:>10} | {r['mean_kib']:>14.1f} | {r['p95_kib']:>13.1f} | {r['retained_kib']:>12.1f}")
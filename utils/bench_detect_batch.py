@@ -0,0 +1,91 @@
+"""
+utils/bench_detect_batch.py
+---------------------------
+Micro-benchmark: SSD face detection with batch sizes 1, 4, 8 and 16 on CPU.
+
+Frames come from a video file if given, otherwise from the enrolled
+images in static/dataset (resized to camera resolution).
+
+    python -m utils.bench_detect_batch [--video gate.mp4] [--iters 20]
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+
+from utils.detectors import SSDFaceDetector
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(BASE_DIR, "..", "static", "dataset")
+BATCH_SIZES = (1, 4, 8, 16)
+FRAME_SIZE = (640, 480)
+
+
+def load_frames(video=None, limit=64):
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+
+    for person in sorted(os.listdir(DATASET_DIR)):
+        person_dir = os.path.join(DATASET_DIR, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for img in sorted(os.listdir(person_dir)):
+            gray = cv2.imread(os.path.join(person_dir, img), cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                continue
+            frames.append(cv2.cvtColor(cv2.resize(gray, FRAME_SIZE), cv2.COLOR_GRAY2BGR))
+            if len(frames) >= limit:
+                return frames
+    return frames
+
+
+def bench(detector, frames, batch_size, iters):
+    batches = [frames[i:i + batch_size] for i in range(0, len(frames) - batch_size + 1, batch_size)]
+    if not batches:
+        return None
+
+    detector.detect_batch(batches[0])  # warm-up
+    n_frames = 0
+    start = time.perf_counter()
+    for _ in range(iters):
+        for batch in batches:
+            detector.detect_batch(batch)
+            n_frames += len(batch)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / n_frames, n_frames / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="video file to sample frames from")
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None, help="cv2.setNumThreads")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    frames = load_frames(args.video, limit=max(BATCH_SIZES) * 4)
+    if not frames:
+        raise SystemExit("[ERROR] No frames to benchmark.")
+
+    detector = SSDFaceDetector()
+    print(f"[INFO] {len(frames)} frames, {cv2.getNumThreads()} OpenCV threads")
+    print(f"{'batch':>5} | {'ms/frame':>9} | {'frames/s':>9}")
+    for size in BATCH_SIZES:
+        result = bench(detector, frames, size, args.iters)
+        if result is None:
+            print(f"{size:>5} | {'n/a':>9} | {'n/a':>9}")
+            continue
+        ms, fps = result
+        print(f"{size:>5} | {ms:>9.2f} | {fps:>9.1f}")
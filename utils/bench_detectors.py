@@ -0,0 +1,119 @@
+"""
+utils/bench_detectors.py
+------------------------
+Compare face detector backends (ssd, yunet, haar) on latency, throughput
+and recall.
+
+  dataset – every enrolled image in static/dataset contains exactly one
+            face. Images are padded so the face is not cut off at the edge.
+            Recall is the share of images where at least one face is found.
+  video   – optional sample video with no ground truth. Reports faces per
+            frame and how often each backend agrees with the reference
+            backend (default ssd) on whether a face is present.
+
+    python -m utils.bench_detectors [--video gate.mp4] [--backends ssd,yunet,haar]
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+
+from utils.detectors import BACKENDS, create_detector
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(BASE_DIR, "..", "static", "dataset")
+PAD_RATIO = 0.5
+CONF_THRESHOLD = 0.5
+
+
+def load_dataset_images():
+    images = []
+    for person in sorted(os.listdir(DATASET_DIR)):
+        person_dir = os.path.join(DATASET_DIR, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for img in sorted(os.listdir(person_dir)):
+            gray = cv2.imread(os.path.join(person_dir, img), cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                continue
+            h, w = gray.shape
+            pad_y, pad_x = int(h * PAD_RATIO), int(w * PAD_RATIO)
+            padded = cv2.copyMakeBorder(gray, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_REPLICATE)
+            images.append(cv2.cvtColor(padded, cv2.COLOR_GRAY2BGR))
+    return images
+
+
+def load_video_frames(path, limit):
+    frames = []
+    cap = cv2.VideoCapture(path)
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(detector, frames):
+    """Detect on every frame; returns (boxes per frame, per-frame latencies in ms)."""
+    detector.detect(frames[0])  # warm-up
+    results, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        results.append(detector.detect(frame))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    mean = sum(ordered) / len(ordered)
+    return mean, ordered[int(0.95 * (len(ordered) - 1))], 1000 / mean
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="sample video file")
+    parser.add_argument("--frames", type=int, default=300, help="max video frames")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--reference", default="ssd", help="backend the video agreement is measured against")
+    args = parser.parse_args()
+
+    detectors = {}
+    for name in args.backends.split(","):
+        try:
+            detectors[name] = create_detector(name, conf_threshold=CONF_THRESHOLD)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"[SKIP] {name}: {e}")
+
+    images = load_dataset_images()
+    if images:
+        print(f"\n[DATASET] {len(images)} enrolled images")
+        print(f"{'backend':>8} | {'mean ms':>8} | {'p95 ms':>7} | {'frames/s':>8} | {'recall':>6}")
+        for name, detector in detectors.items():
+            results, latencies = run(detector, images)
+            mean, p95, fps = summarize(latencies)
+            recall = sum(1 for boxes in results if boxes) / len(results)
+            print(f"{name:>8} | {mean:>8.2f} | {p95:>7.2f} | {fps:>8.1f} | {recall:>6.3f}")
+
+    if args.video:
+        frames = load_video_frames(args.video, args.frames)
+        if not frames:
+            raise SystemExit(f"[ERROR] Cannot read video: {args.video}")
+
+        print(f"\n[VIDEO] {len(frames)} frames from {args.video}")
+        runs = {name: run(detector, frames) for name, detector in detectors.items()}
+        reference = runs.get(args.reference, (None,))[0]
+
+        print(f"{'backend':>8} | {'mean ms':>8} | {'p95 ms':>7} | {'frames/s':>8} | {'faces/frame':>11} | {'agree':>6}")
+        for name, (results, latencies) in runs.items():
+            mean, p95, fps = summarize(latencies)
+            faces = sum(len(b) for b in results) / len(results)
+            agree = "n/a"
+            if reference is not None:
+                same = sum(1 for a, b in zip(results, reference) if bool(a) == bool(b))
+                agree = f"{same / len(results):.3f}"
+            print(f"{name:>8} | {mean:>8.2f} | {p95:>7.2f} | {fps:>8.1f} | {faces:>11.2f} | {agree:>6}")
@@ -0,0 +1,89 @@
+"""
+utils/bench_recognition_api.py
+------------------------------
+Load test for POST /api/recognize: p50 / p99 latency and throughput with
+1, 10 and 50 concurrent clients. Each client sends JPEG frames back to
+back for `--duration` seconds.
+
+Start the app first (with API_KEYS set), then:
+
+    python -m utils.bench_recognition_api --api-key KEY [--video gate.mp4] [--clients 1,10,50]
+
+Compare runs with RECOGNITION_MAX_BATCH=1 (no batching) against the default.
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import cv2
+
+from utils.bench_detect_batch import load_frames
+
+DEFAULT_URL = "http://127.0.0.1:5000/api/recognize"
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def client_loop(url, api_key, payloads, stop, latencies, errors, offset):
+    i = offset
+    while not stop.is_set():
+        req = urllib.request.Request(url, data=payloads[i % len(payloads)], method="POST",
+                                     headers={"Content-Type": "image/jpeg", "X-API-Key": api_key})
+        i += 1
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                json.load(resp)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(1)
+
+
+def run(url, api_key, payloads, clients, duration):
+    latencies, errors = [], []
+    stop = threading.Event()
+    threads = [threading.Thread(target=client_loop, daemon=True,
+                                args=(url, api_key, payloads, stop, latencies, errors, n))
+               for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": len(latencies) / elapsed,
+        "errors": len(errors),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--video", help="video file to sample frames from")
+    parser.add_argument("--clients", default="1,10,50")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, limit=32)
+    if not frames:
+        raise SystemExit("[ERROR] No frames to send.")
+    payloads = [cv2.imencode(".jpg", f)[1].tobytes() for f in frames]
+
+    print(f"{'clients':>7} | {'p50 ms':>8} | {'p99 ms':>8} | {'req/s':>7} | {'errors':>6}")
+    for clients in (int(c) for c in args.clients.split(",")):
+        r = run(args.url, args.api_key, payloads, clients, args.duration)
+        print(f"{clients:>7} | {r['p50_ms']:>8.1f} | {r['p99_ms']:>8.1f} | {r['rps']:>7.1f} | {r['errors']:>6}")
@@ -0,0 +1,72 @@
+"""
+utils/camera_config.py
+----------------------
+Per-camera settings for the recognition runtime, read from a JSON file
+(cameras.json in the repo root, or the path in $CAMERA_CONFIG_FILE):
+
+    {
+      "cameras": [
+        {
+          "id": "main-gate",
+          "source": 0,
+          "roi": [[0.25, 0.10], [0.75, 0.10], [0.75, 0.95], [0.25, 0.95]],
+          "input_scale": 1.5
+        },
+        {"id": "load-test", "source": "samples/gate.mp4", "fps": 25, "loop": true}
+      ]
+    }
+
+source      – camera index, /dev/videoN, RTSP/HTTP URL, video file or image
+              directory (see utils/frame_sources.py)
+
+roi         – polygon of normalized (x, y) points (0..1 of frame width/height)
+              where faces can appear; omit to scan the whole frame
+input_scale – multiplier on the detector's input size (300x300 for the SSD);
+              >1 finds smaller faces
+fps, loop   – pacing and looping for video files / image directories
+"""
+
+import json
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMERA_CONFIG_FILE = os.getenv("CAMERA_CONFIG_FILE",
+                               os.path.join(BASE_DIR, "..", "cameras.json"))
+
+
+class CameraConfig:
+    def __init__(self, camera_id, source=0, roi=None, input_scale=1.0, fps=None, loop=False):
+        self.camera_id = camera_id
+        self.source = source
+        self.roi = roi
+        self.input_scale = float(input_scale)
+        self.fps = fps
+        self.loop = loop
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            camera_id=data["id"],
+            source=data.get("source", 0),
+            roi=data.get("roi"),
+            input_scale=data.get("input_scale", 1.0),
+            fps=data.get("fps"),
+            loop=data.get("loop", False),
+        )
+
+
+def load_camera_configs(path=CAMERA_CONFIG_FILE):
+    """All configured cameras; an empty list if the file does not exist."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [CameraConfig.from_dict(c) for c in data.get("cameras", [])]
+
+
+def get_camera_config(camera_id, path=CAMERA_CONFIG_FILE):
+    """Config for `camera_id`, or full-frame defaults if it is not listed."""
+    for cfg in load_camera_configs(path):
+        if cfg.camera_id == camera_id:
+            return cfg
+    return CameraConfig(camera_id)
@@ -5,11 +5,17 @@ This module initializes and manages the MongoDB connection
 for the entire Flask application.
 """
 
+import threading
 from flask_pymongo import PyMongo
+from pymongo import MongoClient
 
 # Create a global MongoDB instance
 mongo = PyMongo()
 
+DEFAULT_DB_NAME = "AttendanceSystem"
+_runtime_client = None
+_runtime_lock = threading.Lock()
+
 def init_db_connection(app):
     """
     Initialize MongoDB connection with Flask app.
@@ -21,3 +27,21 @@ def init_db_connection(app):
 
     print("MongoDB connection initialized successfully.")
     return mongo
+
+
+def get_runtime_db():
+    """
+    Database handle for code running outside Flask (recognition loops,
+    services, batch jobs). One pooled MongoClient per process, built from
+    Config.MONGO_URI and reused by every caller.
+    """
+    global _runtime_client
+    from config import Config
+    with _runtime_lock:
+        if _runtime_client is None:
+            _runtime_client = MongoClient(
+                Config.MONGO_URI or f"mongodb://localhost:27017/{DEFAULT_DB_NAME}",
+                maxPoolSize=Config.MONGO_POOL_SIZE,
+                serverSelectionTimeoutMS=Config.MONGO_TIMEOUT_MS
+            )
+    return _runtime_client.get_default_database(DEFAULT_DB_NAME)
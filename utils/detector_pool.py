@@ -0,0 +1,75 @@
+"""
+utils/detector_pool.py
+----------------------
+Thread-safe pool of face detectors for the Flask app.
+
+cv2.dnn.Net is not safe to call from several threads at once, so each
+request checks out its own detector. Detectors are created lazily, up to
+`max_instances`; further requests wait for one to be returned. Werkzeug
+and gthread workers reuse idle detectors, so a net is built once per
+concurrently busy thread, not once per request.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import cv2
+
+
+class DetectorPool:
+    def __init__(self, factory, max_instances=None, cv_threads=None):
+        """
+        factory()     – builds one detector (e.g. SSDFaceDetector)
+        max_instances – most detectors alive at once (default: CPU count)
+        cv_threads    – OpenCV worker threads. cv2.setNumThreads is process-wide,
+                        so by default OpenCV keeps its own setting (all cores): the
+                        recognition micro-batcher runs one large forward pass at a
+                        time and needs them. Set it only to cap oversubscription
+                        when many request threads detect at once.
+        """
+        self.factory = factory
+        self.max_instances = max_instances or os.cpu_count() or 1
+        self.created = 0
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        if cv_threads:
+            cv2.setNumThreads(cv_threads)
+        self.cv_threads = cv2.getNumThreads()
+
+    def _checkout(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self.created < self.max_instances:
+                self.created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self.created -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Borrow a detector for the duration of the with-block."""
+        detector = self._checkout(timeout)
+        try:
+            yield detector
+        finally:
+            self._idle.put(detector)
+
+    def stats(self):
+        return {"created": self.created, "idle": self._idle.qsize(),
+                "max_instances": self.max_instances, "cv_threads": self.cv_threads}
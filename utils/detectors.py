@@ -0,0 +1,280 @@
+"""
+utils/detectors.py
+------------------
+Face detectors shared by enrollment (utils/face_utils.py) and
+recognition (utils/mark_attendance.py).
+
+Backends (select with $FACE_DETECTOR_BACKEND, default "ssd"):
+  ssd   – Caffe res10_300x300_ssd; supports batched forward passes
+  yunet – OpenCV cv2.FaceDetectorYN (face_detection_yunet_2023mar.onnx)
+  haar  – Haar cascade shipped with OpenCV; fastest, least accurate
+
+Every backend returns boxes as (x, y, w, h, confidence) in the
+coordinates of the frame it was given.
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SSD_PROTO = os.path.join(BASE_DIR, "deploy.prototxt")
+SSD_WEIGHTS = os.path.join(BASE_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+SSD_INPUT_SIZE = (300, 300)
+SSD_MEAN = (104.0, 177.0, 123.0)
+_SSD_MEAN_CHW = np.array(SSD_MEAN, dtype=np.float32).reshape(3, 1, 1)
+
+YUNET_MODEL = os.path.join(BASE_DIR, "face_detection_yunet_2023mar.onnx")
+HAAR_CASCADE = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+
+DEFAULT_BACKEND = os.getenv("FACE_DETECTOR_BACKEND", "ssd")
+
+
+# -------------------------------------------------------------
+# COMMON INTERFACE
+# -------------------------------------------------------------
+class FaceDetector:
+    """
+    Base class for detector backends.
+
+    input_size is the (w, h) the backend works at for scale 1.0; callers
+    trade accuracy for speed with scaled_input_size().
+
+    metrics: optional utils.metrics.StageMetrics; backends that can split
+    their work record "blob" (resize/mean) and "forward" timings in it.
+    """
+    name = "base"
+    input_size = SSD_INPUT_SIZE
+    metrics = None
+
+    def __init__(self, conf_threshold=0.5):
+        self.conf_threshold = conf_threshold
+
+    def scaled_input_size(self, scale):
+        if scale == 1.0:
+            return self.input_size
+        w, h = self.input_size
+        return max(32, int(w * scale)), max(32, int(h * scale))
+
+    def detect(self, frame, conf_threshold=None, input_size=None):
+        raise NotImplementedError
+
+    def detect_batch(self, frames, conf_threshold=None, input_size=None):
+        """One list of boxes per frame; backends without batching loop."""
+        return [self.detect(f, conf_threshold, input_size) for f in frames]
+
+    def make_buffers(self, input_size):
+        """Preallocated per-size buffers for detect_into(), or None if unsupported."""
+        return None
+
+    def detect_into(self, frame, buffers, conf_threshold=None):
+        return self.detect(frame, conf_threshold)
+
+    def _threshold(self, conf_threshold):
+        return self.conf_threshold if conf_threshold is None else conf_threshold
+
+
+def _fit_resize(frame, input_size):
+    """Shrink frame to fit inside input_size (aspect kept); returns (image, scale back)."""
+    h, w = frame.shape[:2]
+    factor = min(input_size[0] / w, input_size[1] / h, 1.0)
+    if factor == 1.0:
+        return frame, 1.0
+    return cv2.resize(frame, (int(w * factor), int(h * factor))), 1.0 / factor
+
+
+# -------------------------------------------------------------
+# SSD (res10_300x300) DETECTOR
+# -------------------------------------------------------------
+class SSDFaceDetector(FaceDetector):
+    name = "ssd"
+    input_size = SSD_INPUT_SIZE
+
+    def __init__(self, proto=SSD_PROTO, weights=SSD_WEIGHTS, conf_threshold=0.5):
+        super().__init__(conf_threshold)
+        if not (os.path.exists(proto) and os.path.exists(weights)):
+            raise FileNotFoundError(f"❌ Missing DNN model files: {proto}, {weights}")
+        self.net = cv2.dnn.readNetFromCaffe(proto, weights)
+
+    def detect(self, frame, conf_threshold=None, input_size=None):
+        """Boxes (x, y, w, h, confidence) for one frame."""
+        return self.detect_batch([frame], conf_threshold, input_size)[0]
+
+    def detect_batch(self, frames, conf_threshold=None, input_size=None):
+        """
+        Detect faces in several frames with one forward pass.
+        Returns one list of (x, y, w, h, confidence) per input frame.
+
+        input_size is the (w, h) of the network input; smaller is faster but
+        misses small faces. Boxes are always in input-frame coordinates.
+        """
+        if not frames:
+            return []
+        input_size = input_size or self.input_size
+
+        started = time.perf_counter()
+        blob = cv2.dnn.blobFromImages(
+            [cv2.resize(f, input_size) for f in frames],
+            1.0,
+            input_size,
+            SSD_MEAN
+        )
+        return parse_ssd_detections(self._forward(blob, started),
+                                    [f.shape[:2] for f in frames],
+                                    self._threshold(conf_threshold))
+
+    def make_buffers(self, input_size):
+        return SSDBuffers(input_size)
+
+    def detect_into(self, frame, buffers, conf_threshold=None):
+        """detect() variant that builds the blob in preallocated SSDBuffers."""
+        started = time.perf_counter()
+        blob = buffers.fill(frame)
+        return parse_ssd_detections(self._forward(blob, started), [frame.shape[:2]],
+                                    self._threshold(conf_threshold))[0]
+
+    def _forward(self, blob, started):
+        """Run the net on a prepared blob; times blob and forward when metrics are on."""
+        self.net.setInput(blob)
+        if self.metrics is None:
+            return self.net.forward()
+        blob_done = time.perf_counter()
+        out = self.net.forward()
+        self.metrics.observe("blob", blob_done - started)
+        self.metrics.observe("forward", time.perf_counter() - blob_done)
+        return out
+
+
+class SSDBuffers:
+    """Reusable resize target and NCHW float32 blob for one SSD input size."""
+
+    def __init__(self, input_size=SSD_INPUT_SIZE):
+        w, h = input_size
+        self.input_size = input_size
+        self.resized = np.empty((h, w, 3), dtype=np.uint8)
+        self.blob = np.empty((1, 3, h, w), dtype=np.float32)
+
+    def fill(self, frame):
+        """Same result as blobFromImage(resize(frame), 1.0, size, SSD_MEAN), no allocations."""
+        cv2.resize(frame, self.input_size, dst=self.resized)
+        np.subtract(self.resized.transpose(2, 0, 1), _SSD_MEAN_CHW, out=self.blob[0])
+        return self.blob
+
+
+def parse_ssd_detections(detections, sizes, threshold):
+    """
+    Vectorized parsing of SSD DetectionOutput.
+
+    detections: (1, 1, N, 7) rows of [image_id, label, conf, x1, y1, x2, y2]
+    sizes:      (h, w) of each input image
+    Returns one list of (x, y, w, h, confidence) per image.
+    """
+    rows = detections[0, 0]
+    rows = rows[rows[:, 2] > threshold]
+
+    boxes = [[] for _ in sizes]
+    if not len(rows):
+        return boxes
+
+    img = rows[:, 0].astype(np.int32)
+    valid = (img >= 0) & (img < len(sizes))
+    rows, img = rows[valid], img[valid]
+
+    hw = np.asarray(sizes, dtype=np.float32)[img]
+    scale = np.stack([hw[:, 1], hw[:, 0], hw[:, 1], hw[:, 0]], axis=1)
+    xyxy = (rows[:, 3:7] * scale).astype(np.int32)
+    xyxy[:, :2] = np.maximum(xyxy[:, :2], 0)
+
+    for i, (x1, y1, x2, y2), conf in zip(img.tolist(), xyxy.tolist(), rows[:, 2].tolist()):
+        boxes[i].append((x1, y1, x2 - x1, y2 - y1, conf))
+    return boxes
+
+
+# -------------------------------------------------------------
+# YUNET DETECTOR
+# -------------------------------------------------------------
+class YuNetFaceDetector(FaceDetector):
+    name = "yunet"
+    input_size = (320, 320)
+
+    def __init__(self, model=YUNET_MODEL, conf_threshold=0.5, nms_threshold=0.3, top_k=50):
+        super().__init__(conf_threshold)
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"❌ Missing YuNet model file: {model}")
+        self.net = cv2.FaceDetectorYN.create(model, "", self.input_size, conf_threshold,
+                                             nms_threshold, top_k)
+        self._net_threshold = conf_threshold
+
+    def detect(self, frame, conf_threshold=None, input_size=None):
+        threshold = self._threshold(conf_threshold)
+        if threshold != self._net_threshold:
+            self.net.setScoreThreshold(threshold)
+            self._net_threshold = threshold
+
+        image, back = _fit_resize(frame, input_size or self.input_size)
+        h, w = image.shape[:2]
+        self.net.setInputSize((w, h))
+        _, faces = self.net.detect(image)
+        if faces is None:
+            return []
+
+        boxes = []
+        for (x, y, bw, bh), score in zip((faces[:, :4] * back).astype(np.int32).tolist(),
+                                         faces[:, 14].tolist()):
+            boxes.append((max(0, x), max(0, y), bw, bh, score))
+        return boxes
+
+
+# -------------------------------------------------------------
+# HAAR CASCADE DETECTOR
+# -------------------------------------------------------------
+class HaarFaceDetector(FaceDetector):
+    """Fast path for weak hardware. Haar gives no score, so confidence is 1.0."""
+    name = "haar"
+    input_size = (320, 320)
+
+    def __init__(self, cascade=HAAR_CASCADE, conf_threshold=0.5, min_neighbors=5):
+        super().__init__(conf_threshold)
+        self.cascade = cv2.CascadeClassifier(cascade)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"❌ Missing Haar cascade file: {cascade}")
+        self.min_neighbors = min_neighbors
+
+    def detect(self, frame, conf_threshold=None, input_size=None):
+        image, back = _fit_resize(frame, input_size or self.input_size)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        found = self.cascade.detectMultiScale(image, scaleFactor=1.1,
+                                              minNeighbors=self.min_neighbors, minSize=(24, 24))
+        return [(int(x * back), int(y * back), int(w * back), int(h * back), 1.0)
+                for (x, y, w, h) in found]
+
+
+# -------------------------------------------------------------
+# FACTORY
+# -------------------------------------------------------------
+BACKENDS = {
+    "ssd": SSDFaceDetector,
+    "yunet": YuNetFaceDetector,
+    "haar": HaarFaceDetector,
+}
+
+
+def create_detector(backend=None, conf_threshold=0.5):
+    """Build the configured detector backend ($FACE_DETECTOR_BACKEND by default)."""
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown face detector backend: {backend} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[backend](conf_threshold=conf_threshold)
+
+
+__all__ = [
+    "FaceDetector",
+    "SSDFaceDetector",
+    "YuNetFaceDetector",
+    "HaarFaceDetector",
+    "SSDBuffers",
+    "parse_ssd_detections",
+    "create_detector",
+]
@@ -0,0 +1,403 @@
+"""
+utils/embeddings.py
+-------------------
+Embedding-based face recognition, an alternative to LBPH.
+
+Backends (select with $FACE_RECOGNIZER_BACKEND, default "lbph"):
+  lbph  – cv2.face LBPH model (lbph_model.yml + labels.pkl)
+  sface – OpenCV SFace (face_recognition_sface_2021dec.onnx, 128-d
+          embeddings) with a nearest-neighbour index (face_embeddings.npz)
+
+All enrolled embeddings are L2-normalized rows of one contiguous float32
+matrix, so identifying a batch of crops is a single matrix multiply
+(cosine similarity) plus an argmax. Users are enrolled incrementally:
+only the new user's crops are embedded and their rows appended.
+
+EmbeddingRecognizer mimics the LBPH API (predict(crop) -> (label,
+distance)), so it plugs in wherever an LBPH recognizer is used. Its
+distance is (1 - cosine similarity) * 100; lower is better, as with LBPH.
+
+SFace expects colour, landmark-aligned 112x112 faces. Every crop
+(enrollment, --rebuild, live) goes through the same path: YuNet finds the
+five landmarks on the crop and alignCrop() warps it; crops where no face
+is found fall back to a letterboxed (not stretched) resize. SFace's
+reference threshold assumes aligned faces, so calibrate it on your own
+enrollments:
+
+    python -m utils.embeddings --rebuild       # re-embed static/dataset
+    python -m utils.embeddings --calibrate     # suggest EMBEDDING_MATCH_DISTANCE
+"""
+
+import argparse
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from utils.detectors import YUNET_MODEL
+from utils.log import get_logger
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SFACE_MODEL = os.path.join(BASE_DIR, "face_recognition_sface_2021dec.onnx")
+SFACE_INPUT_SIZE = (112, 112)
+EMBEDDINGS_FILE = os.path.join(BASE_DIR, "..", "face_embeddings.npz")
+DATASET_DIR = os.path.join(BASE_DIR, "..", "static", "dataset")
+
+# SFace's reference cosine threshold 0.363, as a distance; override with the
+# value suggested by --calibrate
+EMBEDDING_MATCH_DISTANCE = float(os.getenv("EMBEDDING_MATCH_DISTANCE", "63.7"))
+
+# Detector crops are tight; pad them so YuNet sees the whole face
+ALIGN_PAD_RATIO = 0.25
+ALIGN_MIN_SCORE = 0.6
+CALIBRATION_FAR = 0.001
+
+DEFAULT_RECOGNIZER_BACKEND = os.getenv("FACE_RECOGNIZER_BACKEND", "lbph").lower()
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+log = get_logger("embeddings")
+
+
+def is_grayscale(image):
+    """True for single-channel images and BGR images whose channels are equal."""
+    if image.ndim == 2:
+        return True
+    return bool((image[..., 0] == image[..., 1]).all() and (image[..., 1] == image[..., 2]).all())
+
+
+def _letterbox(crop, size=SFACE_INPUT_SIZE):
+    """Pad to a square (edge pixels) and resize, keeping the face's aspect ratio."""
+    h, w = crop.shape[:2]
+    side = max(h, w)
+    top, left = (side - h) // 2, (side - w) // 2
+    square = cv2.copyMakeBorder(crop, top, side - h - top, left, side - w - left,
+                                cv2.BORDER_REPLICATE)
+    return cv2.resize(square, size)
+
+
+# -------------------------------------------------------------
+# EMBEDDER
+# -------------------------------------------------------------
+class SFaceEmbedder:
+    """
+    Face crops (BGR; grayscale is converted) -> L2-normalized float32
+    embeddings. Crops are landmark-aligned with YuNet when its model file
+    is present (align=None), else letterboxed.
+    """
+    dim = 128
+
+    def __init__(self, model=SFACE_MODEL, align=None, landmarks_model=YUNET_MODEL):
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"❌ Missing SFace model file: {model}")
+        self.net = cv2.FaceRecognizerSF.create(model, "")
+        self.landmarks = None
+        if align is None:
+            align = os.path.exists(landmarks_model)
+        if align:
+            if not os.path.exists(landmarks_model):
+                raise FileNotFoundError(f"❌ Missing YuNet model file: {landmarks_model}")
+            self.landmarks = cv2.FaceDetectorYN.create(landmarks_model, "", (320, 320),
+                                                       ALIGN_MIN_SCORE)
+        else:
+            log.warning("alignment_disabled", model=landmarks_model)
+        self.aligned = 0
+        self.unaligned = 0
+        # FaceRecognizerSF / FaceDetectorYN are not safe to share between threads
+        self._lock = threading.Lock()
+
+    def _align(self, crop):
+        """112x112 SFace input: aligned on YuNet landmarks, else letterboxed."""
+        if self.landmarks is not None:
+            h, w = crop.shape[:2]
+            pad = int(ALIGN_PAD_RATIO * max(h, w))
+            padded = cv2.copyMakeBorder(crop, pad, pad, pad, pad, cv2.BORDER_CONSTANT)
+            self.landmarks.setInputSize((padded.shape[1], padded.shape[0]))
+            _, faces = self.landmarks.detect(padded)
+            if faces is not None and len(faces):
+                self.aligned += 1
+                return self.net.alignCrop(padded, faces[faces[:, 14].argmax()])
+        self.unaligned += 1
+        return _letterbox(crop)
+
+    def embed(self, crops):
+        """(len(crops), dim) C-contiguous float32 array, one unit-length row per crop."""
+        out = np.empty((len(crops), self.dim), dtype=np.float32)
+        with self._lock:
+            for i, crop in enumerate(crops):
+                if crop.ndim == 2:
+                    crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+                out[i] = self.net.feature(self._align(crop)).reshape(-1)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, np.maximum(norms, 1e-12), out=out)
+        return out
+
+
+# -------------------------------------------------------------
+# NEAREST-NEIGHBOUR INDEX
+# -------------------------------------------------------------
+class EmbeddingIndex:
+    """
+    Enrolled embeddings with their label ids.
+
+    Rows live in a preallocated buffer that doubles when full; `matrix`
+    is a view of its used prefix, so it stays contiguous without copying
+    the whole gallery on every enrollment.
+    """
+
+    def __init__(self, dim=SFaceEmbedder.dim, capacity=256):
+        self.dim = dim
+        self.label_map = {}                      # "name_uid" -> label id (as labels.pkl)
+        self._buf = np.empty((capacity, dim), dtype=np.float32)
+        self._labels = np.empty(capacity, dtype=np.int32)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def matrix(self):
+        return self._buf[:self._n]
+
+    @property
+    def labels(self):
+        return self._labels[:self._n]
+
+    def _reserve(self, n):
+        if n <= len(self._buf):
+            return
+        capacity = max(n, 2 * len(self._buf))
+        buf = np.empty((capacity, self.dim), dtype=np.float32)
+        labels = np.empty(capacity, dtype=np.int32)
+        buf[:self._n] = self.matrix
+        labels[:self._n] = self.labels
+        self._buf, self._labels = buf, labels
+
+    def add(self, key, vectors):
+        """Append unit-length vectors for `key` ("name_uid"); returns its label id."""
+        label = self.label_map.setdefault(key, max(self.label_map.values(), default=-1) + 1)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        self._reserve(self._n + len(vectors))
+        self._buf[self._n:self._n + len(vectors)] = vectors
+        self._labels[self._n:self._n + len(vectors)] = label
+        self._n += len(vectors)
+        return label
+
+    def remove(self, key):
+        """Drop every row of `key`; its label id is not reused."""
+        label = self.label_map.pop(key, None)
+        if label is None:
+            return
+        keep = self.labels != label
+        n = int(keep.sum())
+        self._buf[:n] = self.matrix[keep]
+        self._labels[:n] = self.labels[keep]
+        self._n = n
+
+    def search(self, queries):
+        """Best (label ids, cosine similarities) for unit-length query rows."""
+        if not self._n or not len(queries):
+            return np.full(len(queries), -1, dtype=np.int32), np.zeros(len(queries), dtype=np.float32)
+        sims = queries @ self.matrix.T                       # (queries, enrolled)
+        best = sims.argmax(axis=1)
+        return self.labels[best], sims[np.arange(len(queries)), best]
+
+    def save(self, path=EMBEDDINGS_FILE):
+        """Write atomically so a running recognizer never reads half a file."""
+        keys = sorted(self.label_map, key=self.label_map.get)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, matrix=self.matrix, labels=self.labels,
+                 keys=np.array(keys, dtype=str),
+                 key_labels=np.array([self.label_map[k] for k in keys], dtype=np.int32))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=EMBEDDINGS_FILE):
+        with np.load(path) as data:
+            matrix = data["matrix"]
+            index = cls(dim=matrix.shape[1] if matrix.ndim == 2 else SFaceEmbedder.dim,
+                        capacity=max(256, len(matrix)))
+            index._buf[:len(matrix)] = matrix
+            index._labels[:len(matrix)] = data["labels"]
+            index._n = len(matrix)
+            index.label_map = {str(k): int(v) for k, v in zip(data["keys"], data["key_labels"])}
+        return index
+
+
+# -------------------------------------------------------------
+# LBPH-COMPATIBLE RECOGNIZER
+# -------------------------------------------------------------
+class EmbeddingRecognizer:
+    """SFace embedder + index behind the LBPH predict() interface."""
+    color_input = True
+    match_distance = EMBEDDING_MATCH_DISTANCE
+
+    def __init__(self, index, embedder=None):
+        self.index = index
+        self.embedder = embedder or SFaceEmbedder()
+
+    @property
+    def label_map(self):
+        return self.index.label_map
+
+    def predict_batch(self, crops):
+        """[(label id, distance)] for many crops: one embed pass, one matmul."""
+        if not crops:
+            return []
+        labels, sims = self.index.search(self.embedder.embed(crops))
+        return [(int(label), float((1.0 - sim) * 100.0)) for label, sim in zip(labels, sims)]
+
+    def predict(self, crop):
+        return self.predict_batch([crop])[0]
+
+    def stats(self):
+        return {"aligned": self.embedder.aligned, "unaligned": self.embedder.unaligned,
+                "match_distance": self.match_distance}
+
+
+def load_embedding_recognizer(path=EMBEDDINGS_FILE):
+    """EmbeddingRecognizer for the saved index, or None if nobody is enrolled."""
+    if not os.path.exists(path):
+        return None
+    return EmbeddingRecognizer(EmbeddingIndex.load(path))
+
+
+# -------------------------------------------------------------
+# ENROLLMENT
+# -------------------------------------------------------------
+_enroll_lock = threading.Lock()
+_embedder = None
+
+
+def _shared_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = SFaceEmbedder()
+    return _embedder
+
+
+def enroll_user(key, crops, path=EMBEDDINGS_FILE):
+    """
+    Incremental enrollment: embed only this user's crops and replace their
+    rows in the saved index. Returns the embeddings (for storing in the DB).
+    """
+    vectors = _shared_embedder().embed(crops)
+    with _enroll_lock:
+        index = EmbeddingIndex.load(path) if os.path.exists(path) else EmbeddingIndex()
+        index.remove(key)
+        index.add(key, vectors)
+        index.save(path)
+    return vectors
+
+
+def load_dataset_crops(dataset_dir=DATASET_DIR, include_gray=False):
+    """
+    {"name_uid": [BGR crops]} from the dataset folders. Grayscale images
+    (saved by older enrollments) are skipped unless include_gray: live
+    recognition embeds colour crops, so they would not match the gallery.
+    """
+    people = {}
+    for person in sorted(os.listdir(dataset_dir)):
+        person_dir = os.path.join(dataset_dir, person)
+        if not os.path.isdir(person_dir):
+            continue
+        crops = [cv2.imread(os.path.join(person_dir, f)) for f in sorted(os.listdir(person_dir))
+                 if f.lower().endswith(IMAGE_EXTENSIONS)]
+        crops = [c for c in crops if c is not None]
+        color = [c for c in crops if not is_grayscale(c)]
+        if len(color) < len(crops):
+            log.warning("grayscale_images", person=person, gray=len(crops) - len(color),
+                        used=include_gray, hint="re-enroll to store colour crops")
+        crops = crops if include_gray else color
+        if crops:
+            people[person] = crops
+    return people
+
+
+def build_embedding_index(dataset_dir=DATASET_DIR, path=EMBEDDINGS_FILE, include_gray=False):
+    """Full rebuild from the dataset folders (one per "name_uid"), like train_lbph_model()."""
+    index = EmbeddingIndex()
+    embedder = _shared_embedder()
+    for person, crops in load_dataset_crops(dataset_dir, include_gray).items():
+        index.add(person, embedder.embed(crops))
+
+    with _enroll_lock:
+        index.save(path)
+    return index
+
+
+# -------------------------------------------------------------
+# THRESHOLD CALIBRATION
+# -------------------------------------------------------------
+def calibrate_threshold(dataset_dir=DATASET_DIR, far=CALIBRATION_FAR, include_gray=False):
+    """
+    Suggest a match distance from the enrolled crops: genuine pairs (same
+    person) vs impostor pairs (different people), threshold at the given
+    false accept rate. Returns a dict with the threshold and both rates.
+    """
+    people = load_dataset_crops(dataset_dir, include_gray)
+    embedder = _shared_embedder()
+    vectors, owners = [], []
+    for i, crops in enumerate(people.values()):
+        vectors.append(embedder.embed(crops))
+        owners.extend([i] * len(crops))
+    if len(people) < 2:
+        raise ValueError("calibration needs at least two enrolled people")
+
+    matrix = np.concatenate(vectors)
+    owners = np.array(owners)
+    distances = (1.0 - matrix @ matrix.T) * 100.0
+    upper = np.triu(np.ones(distances.shape, dtype=bool), k=1)
+    same = owners[:, None] == owners[None, :]
+    genuine = distances[upper & same]
+    impostor = np.sort(distances[upper & ~same])
+
+    # Largest distance that accepts at most `far` of the impostor pairs
+    threshold = float(impostor[int(far * len(impostor))])
+    return {
+        "threshold": round(threshold, 1),
+        "far": round(float((impostor < threshold).mean()), 5),
+        "frr": round(float((genuine >= threshold).mean()), 4) if len(genuine) else None,
+        "genuine_pairs": int(len(genuine)),
+        "impostor_pairs": int(len(impostor)),
+        "aligned": embedder.aligned,
+        "unaligned": embedder.unaligned,
+    }
+
+
+__all__ = [
+    "EMBEDDING_MATCH_DISTANCE",
+    "EMBEDDINGS_FILE",
+    "DEFAULT_RECOGNIZER_BACKEND",
+    "SFaceEmbedder",
+    "EmbeddingIndex",
+    "EmbeddingRecognizer",
+    "load_embedding_recognizer",
+    "enroll_user",
+    "build_embedding_index",
+    "calibrate_threshold",
+    "is_grayscale",
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face embedding index")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed every dataset folder")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="suggest EMBEDDING_MATCH_DISTANCE from the dataset")
+    parser.add_argument("--far", type=float, default=CALIBRATION_FAR,
+                        help="target false accept rate for --calibrate")
+    parser.add_argument("--include-gray", action="store_true",
+                        help="also use grayscale images from older enrollments")
+    parser.add_argument("--dataset", default=DATASET_DIR)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        built = build_embedding_index(args.dataset, include_gray=args.include_gray)
+        print(f"[OK] {len(built)} embeddings for {len(built.label_map)} people → {EMBEDDINGS_FILE}")
+    elif args.calibrate:
+        result = calibrate_threshold(args.dataset, args.far, args.include_gray)
+        print(f"[OK] EMBEDDING_MATCH_DISTANCE={result['threshold']} "
+              f"(FAR {result['far']}, FRR {result['frr']})", result)
+    else:
+        parser.print_help()
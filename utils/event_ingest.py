@@ -0,0 +1,168 @@
+"""
+utils/event_ingest.py
+---------------------
+Idempotent ingestion of recognition events sent by edge nodes
+(POST /api/events, see controllers/api_controller.py).
+
+Every event carries a client-generated event_id, stored as the _id of
+its attendance_events document, so a retried batch can't be applied
+twice. A request's events are applied to attendances with the normal
+check-in / check-out rules in one bulk_write; an event is flagged
+"applied" only after that write succeeds, so a batch that failed half
+way is completed by the client's retry.
+
+A request first claims its events (claim = a token of its own, set
+atomically on insert or on unapplied, unclaimed documents). Only
+claimed events are applied, so a resend arriving while the first
+request is still writing reports them as duplicates instead of
+applying them again. Claims older than CLAIM_TIMEOUT_SECONDS (a request
+that died) can be taken over.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from utils.attendance_rules import IST, bulk_mark_attendance
+from utils.sightings import record_sightings_safely, sighting_doc
+
+MAX_BATCH = 500
+DUPLICATE_KEY = 11000
+CLAIM_TIMEOUT_SECONDS = 120
+
+
+def _parse_event(raw):
+    """Validated event dict, or raises ValueError."""
+    if not isinstance(raw, dict):
+        raise ValueError("event must be an object")
+    for field in ("event_id", "user_id", "camera_id", "event_time"):
+        if not raw.get(field):
+            raise ValueError(f"missing {field}")
+    if not ObjectId.is_valid(str(raw["user_id"])):
+        raise ValueError("bad user_id")
+
+    try:
+        event_time = datetime.fromisoformat(str(raw["event_time"]))
+    except ValueError:
+        raise ValueError("bad event_time (ISO 8601 expected)")
+    if event_time.tzinfo is None:
+        event_time = event_time.replace(tzinfo=IST)
+
+    confidence = raw.get("confidence")
+    return {
+        "_id": str(raw["event_id"]),
+        "user_id": str(raw["user_id"]),
+        "camera_id": str(raw["camera_id"]),
+        "event_time": event_time,
+        "confidence": float(confidence) if confidence is not None else None,
+    }
+
+
+def ingest_events(db, raw_events):
+    """
+    Store and apply a batch of edge events.
+    Returns {"results": [{event_id, action}], "duplicates": [...], "rejected": [...]}.
+    """
+    events, rejected = [], []
+    for raw in raw_events:
+        try:
+            events.append(_parse_event(raw))
+        except (ValueError, TypeError) as e:
+            rejected.append({"event_id": raw.get("event_id") if isinstance(raw, dict) else None,
+                             "error": str(e)})
+
+    # ---------------------------
+    # DEDUP ON event_id
+    # ---------------------------
+    by_id = {}
+    for event in events:
+        by_id.setdefault(event["_id"], event)
+
+    seen = {d["_id"]: d.get("applied", False)
+            for d in db.attendance_events.find({"_id": {"$in": list(by_id)}}, {"applied": 1})}
+
+    # ---------------------------
+    # CLAIM
+    # ---------------------------
+    token = uuid.uuid4().hex
+    now = datetime.now(IST)
+    new = [dict(e, applied=False, received_at=now, claim=token, claimed_at=now)
+           for eid, e in by_id.items() if eid not in seen]
+    if new:
+        try:
+            db.attendance_events.insert_many(new, ordered=False)
+        except BulkWriteError as e:
+            # Another request inserted the same event_id first; it applies it
+            for err in e.details.get("writeErrors", []):
+                if err.get("code") != DUPLICATE_KEY:
+                    raise
+
+    unapplied = [eid for eid, applied in seen.items() if not applied]
+    if unapplied:
+        # Left unapplied by a failed request, or in flight in another one
+        db.attendance_events.update_many(
+            {"_id": {"$in": unapplied}, "applied": False,
+             "$or": [{"claim": None},
+                     {"claimed_at": {"$lt": now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)}}]},
+            {"$set": {"claim": token, "claimed_at": now}}
+        )
+
+    claimed = {d["_id"] for d in db.attendance_events.find(
+        {"_id": {"$in": list(by_id)}, "claim": token}, {"_id": 1})}
+    pending = [e for eid, e in by_id.items() if eid in claimed]
+    duplicates = sorted(eid for eid in by_id if eid not in claimed)
+
+    try:
+        results = _apply_claimed(db, pending, rejected)
+    except Exception:
+        # Let the client's retry claim them again
+        db.attendance_events.update_many(
+            {"_id": {"$in": list(claimed)}, "claim": token},
+            {"$unset": {"claim": "", "claimed_at": ""}}
+        )
+        raise
+
+    return {
+        "results": results,
+        "duplicates": duplicates,
+        "rejected": rejected,
+    }
+
+
+def _apply_claimed(db, pending, rejected):
+    """Apply this request's claimed events; returns [{event_id, action}]."""
+    # ---------------------------
+    # APPLY (one bulk write)
+    # ---------------------------
+    users = {
+        str(u["_id"]): u for u in db.users.find(
+            {"_id": {"$in": list({ObjectId(e["user_id"]) for e in pending})}},
+            {"institute_id": 1}
+        )
+    }
+    unknown = [e for e in pending if e["user_id"] not in users]
+    pending = [e for e in pending if e["user_id"] in users]
+    for e in unknown:
+        rejected.append({"event_id": e["_id"], "error": "unknown user_id"})
+    if unknown:
+        db.attendance_events.delete_many({"_id": {"$in": [e["_id"] for e in unknown]}})
+
+    actions = bulk_mark_attendance(db.attendances, [
+        (e["user_id"], users[e["user_id"]].get("institute_id"), e["event_time"])
+        for e in pending
+    ])
+    record_sightings_safely(db, [
+        sighting_doc(e["user_id"], e["camera_id"], e["event_time"], source="edge",
+                     confidence=e["confidence"])
+        for e in pending
+    ])
+    if pending:
+        db.attendance_events.update_many(
+            {"_id": {"$in": [e["_id"] for e in pending]}},
+            {"$set": {"applied": True, "applied_at": datetime.now(IST)},
+             "$unset": {"claim": "", "claimed_at": ""}}
+        )
+
+    return [{"event_id": e["_id"], "action": action} for e, action in zip(pending, actions)]
@@ -0,0 +1,172 @@
+"""
+utils/event_journal.py
+----------------------
+Local durable journal for attendance events.
+
+The recognition loop appends every event to a SQLite database in WAL
+mode (a local insert, no network) and moves on. A JournalReplayer thread
+drains the journal to MongoDB in batches and only deletes rows once the
+batch was written, backing off exponentially while the database is
+unreachable. Events recorded during an outage, or before a crash, are
+replayed on the next start.
+
+Rows flagged sighting_only are repeats already answered from the
+attendance cache: they are kept as raw sightings but do not touch
+attendance.
+"""
+
+import os
+import sqlite3
+import threading
+
+from utils.log import get_logger
+
+log = get_logger("journal")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_JOURNAL_FILE = os.getenv("ATTENDANCE_JOURNAL",
+                                 os.path.join(BASE_DIR, "..", "attendance_journal.db"))
+
+
+class EventJournal:
+    def __init__(self, path=DEFAULT_JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL survives process crashes; only an OS crash can lose the last commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id     TEXT NOT NULL,
+                user_name   TEXT,
+                camera_id   TEXT,
+                event_time  TEXT NOT NULL,
+                distance    REAL,
+                institute_id TEXT,
+                sighting_only INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(events)")}
+        if "institute_id" not in columns:  # journals written before institute_id was kept
+            self._conn.execute("ALTER TABLE events ADD COLUMN institute_id TEXT")
+        if "sighting_only" not in columns:
+            self._conn.execute("ALTER TABLE events ADD COLUMN sighting_only INTEGER NOT NULL DEFAULT 0")
+        self.appended = 0
+
+    def append(self, user_id, user_name, event_time, camera_id=None, distance=None,
+               institute_id=None, sighting_only=False):
+        """Record one event; event_time is an aware datetime."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (user_id, user_name, camera_id, event_time, distance, "
+                "institute_id, sighting_only) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(user_id), user_name, camera_id, event_time.isoformat(), distance, institute_id,
+                 int(sighting_only))
+            )
+            self.appended += 1
+
+    def peek(self, limit):
+        """Oldest `limit` events as (id, user_id, user_name, camera_id, event_time,
+        distance, institute_id, sighting_only)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, user_id, user_name, camera_id, event_time, distance, institute_id, "
+                "sighting_only FROM events ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+    def ack(self, ids):
+        """Delete events that reached the database."""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM events WHERE id = ?", [(i,) for i in ids])
+
+    def pending(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalReplayer:
+    """
+    Background thread that drains an EventJournal.
+
+    apply_batch(rows) writes the rows to the database and raises on
+    failure; the same rows are retried after the current backoff.
+    """
+
+    def __init__(self, journal, apply_batch, batch_size=200, poll_interval=0.5,
+                 backoff_min=1.0, backoff_max=60.0):
+        self.journal = journal
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+        self.backoff = backoff_min
+        self.replayed = 0
+        self.failures = 0
+        self.last_error = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal-replayer", daemon=True)
+            self._thread.start()
+        return self
+
+    def drain_once(self):
+        """Replay one batch; returns the number of events written."""
+        rows = self.journal.peek(self.batch_size)
+        if not rows:
+            return 0
+        self.apply_batch(rows)
+        self.journal.ack([row[0] for row in rows])
+        self.replayed += len(rows)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                written = self.drain_once()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                log.warning("replay_failed", error=e, retry_in=round(self.backoff),
+                            pending=self.journal.pending(), key="replay_failed", every=30)
+                self._stop.wait(self.backoff)
+                self.backoff = min(self.backoff_max, self.backoff * 2)
+                continue
+
+            self.backoff = self.backoff_min
+            if written < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self, timeout=5.0):
+        """Stop the thread after one last best-effort drain."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            while self.drain_once():
+                pass
+        except Exception as e:
+            log.warning("events_left", pending=self.journal.pending(), error=e)
+
+    def stats(self):
+        return {
+            "pending": self.journal.pending(),
+            "appended": self.journal.appended,
+            "replayed": self.replayed,
+            "failures": self.failures,
+            "backoff": self.backoff,
+        }
@@ -6,6 +6,7 @@ Final Face Utilities Integration
 ✅ Fast camera startup (cv2.CAP_DSHOW)
 ✅ DNN-based face detection (no dlib)
 ✅ LBPH model training (lightweight + accurate)
+✅ Optional SFace embedding index with incremental enrollment (utils/embeddings.py)
 ✅ Dataset + .pkl + .yml + MongoDB integration
 ✅ All data stored inside user's face_data
 ✅ Auto-delete folder if DB update fails
@@ -16,9 +17,16 @@ import cv2
 import numpy as np
 import pickle
 import shutil
+import threading
 from datetime import datetime
 from bson import ObjectId
+from config import Config
 from utils.db import mongo
+from utils.detector_pool import DetectorPool
+from utils.detectors import create_detector
+from utils.embeddings import (DEFAULT_RECOGNIZER_BACKEND, EMBEDDINGS_FILE, enroll_user,
+                               load_embedding_recognizer)
+from utils.log import get_logger
 
 # ==============================
 # GLOBAL CONFIG
@@ -27,36 +35,134 @@ DATASET_DIR = os.path.join("static", "dataset")
 MODEL_FILE = "lbph_model.yml"
 LABELS_FILE = "labels.pkl"
 
-MODEL_PROTO = os.path.join("utils", "deploy.prototxt")
-MODEL_WEIGHTS = os.path.join("utils", "res10_300x300_ssd_iter_140000.caffemodel")
+CONFIDENCE_THRESHOLD = 0.6
+LBPH_MATCH_DISTANCE = 70
 
-if not (os.path.exists(MODEL_PROTO) and os.path.exists(MODEL_WEIGHTS)):
-    raise FileNotFoundError(f"❌ Missing DNN model files: {MODEL_PROTO}, {MODEL_WEIGHTS}")
+# "lbph" (retrain on every enrollment) or "sface" (incremental embedding index)
+RECOGNIZER_BACKEND = DEFAULT_RECOGNIZER_BACKEND
 
-FACE_NET = cv2.dnn.readNetFromCaffe(MODEL_PROTO, MODEL_WEIGHTS)
-CONFIDENCE_THRESHOLD = 0.6
+log = get_logger("enroll")
+
+# One detector per concurrently busy request thread, created on first use.
+# Backend is chosen per deployment with $FACE_DETECTOR_BACKEND (utils/detectors.py).
+FACE_DETECTORS = DetectorPool(
+    lambda: create_detector(conf_threshold=CONFIDENCE_THRESHOLD),
+    max_instances=Config.FACE_DETECTOR_POOL_SIZE,
+    cv_threads=Config.FACE_DETECTOR_CV_THREADS
+)
 
 
 # -------------------------------------------------------------
 # DNN FACE DETECTION
 # -------------------------------------------------------------
 def detect_faces_dnn(frame, conf_threshold=CONFIDENCE_THRESHOLD):
-    h, w = frame.shape[:2]
-    blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0,
-                                 (300, 300), (104.0, 177.0, 123.0))
-    FACE_NET.setInput(blob)
-    detections = FACE_NET.forward()
-
-    boxes = []
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > conf_threshold:
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (x1, y1, x2, y2) = box.astype("int")
-            x1, y1 = max(0, x1), max(0, y1)
-            boxes.append((x1, y1, x2 - x1, y2 - y1, confidence))
-    return boxes
+    with FACE_DETECTORS.acquire() as detector:
+        return detector.detect(frame, conf_threshold)
+
 
+def detect_faces_dnn_batch(frames, conf_threshold=CONFIDENCE_THRESHOLD, input_size=None):
+    """One forward pass for several frames; returns boxes per frame.
+    input_size: detector (w, h) input, default the backend's own."""
+    with FACE_DETECTORS.acquire() as detector:
+        return detector.detect_batch(frames, conf_threshold, input_size)
+
+
+# -------------------------------------------------------------
+# LBPH RECOGNITION (server side)
+# -------------------------------------------------------------
+_recognizer_lock = threading.Lock()
+_recognizer_cache = {"mtime": None, "recognizer": None, "rev": {}}
+
+
+def load_lbph_recognizer():
+    """
+    Shared (recognizer, reverse label map), reloaded when the model file
+    changes (e.g. after train_lbph_model). (None, {}) if nothing is trained.
+    """
+    if not os.path.exists(MODEL_FILE) or not os.path.exists(LABELS_FILE):
+        return None, {}
+
+    mtime = os.path.getmtime(MODEL_FILE)
+    with _recognizer_lock:
+        cache = _recognizer_cache
+        if cache["mtime"] != mtime:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(MODEL_FILE)
+            with open(LABELS_FILE, "rb") as f:
+                labels = pickle.load(f)
+            cache.update(mtime=mtime, recognizer=recognizer,
+                         rev={v: k for k, v in labels.items()})
+        return cache["recognizer"], cache["rev"]
+
+
+_embedding_cache = {"mtime": None, "recognizer": None, "rev": {}}
+
+
+def load_face_recognizer():
+    """
+    (recognizer, reverse label map) for the configured backend, reloaded
+    when its file changes. (None, {}) if nothing is trained / enrolled.
+    """
+    if RECOGNIZER_BACKEND != "sface":
+        return load_lbph_recognizer()
+    if not os.path.exists(EMBEDDINGS_FILE):
+        return None, {}
+
+    mtime = os.path.getmtime(EMBEDDINGS_FILE)
+    with _recognizer_lock:
+        cache = _embedding_cache
+        if cache["mtime"] != mtime:
+            recognizer = load_embedding_recognizer(EMBEDDINGS_FILE)
+            cache.update(mtime=mtime, recognizer=recognizer,
+                         rev={v: k for k, v in recognizer.label_map.items()})
+        return cache["recognizer"], cache["rev"]
+
+
+def recognize_face_crops(crops):
+    """
+    Identify face crops (BGR or grayscale) with one loaded model; the
+    embedding backend does the whole list in one matrix multiply.
+    Returns (user_id, name, distance) per crop; user_id/name None if unknown.
+    """
+    recognizer, rev = load_face_recognizer()
+    results = [(None, None, None)] * len(crops)
+    valid = [i for i, crop in enumerate(crops) if crop.size]
+    if recognizer is None or not valid:
+        return results
+
+    if hasattr(recognizer, "predict_batch"):
+        predictions = recognizer.predict_batch([crops[i] for i in valid])
+    else:
+        predictions = [recognizer.predict(crops[i] if crops[i].ndim == 2
+                                          else cv2.cvtColor(crops[i], cv2.COLOR_BGR2GRAY))
+                       for i in valid]
+
+    match_distance = getattr(recognizer, "match_distance", LBPH_MATCH_DISTANCE)
+    for i, (label, distance) in zip(valid, predictions):
+        full = rev.get(label) if distance < match_distance else None
+        if full and "_" in full:
+            name, uid = full.rsplit("_", 1)
+            results[i] = (uid, name, float(distance))
+        else:
+            results[i] = (None, None, float(distance))
+    return results
+
+
+def recognize_frames(frames):
+    """
+    Detect (one batched DNN pass) and identify every face in BGR frames.
+    Returns one list per frame of (x, y, w, h, user_id, name, distance).
+    """
+    crops, owners = [], []
+    for i, (frame, faces) in enumerate(zip(frames, detect_faces_dnn_batch(frames))):
+        for (x, y, w, h, conf) in faces:
+            crops.append(frame[y:y + h, x:x + w])
+            owners.append((i, (x, y, w, h)))
+
+    results = [[] for _ in frames]
+    for (i, box), identity in zip(owners, recognize_face_crops(crops)):
+        results[i].append((*box, *identity))
+    return results
 
 # -------------------------------------------------------------
 # 1️⃣ CAPTURE FACE IMAGES + STORE IN DB
@@ -70,12 +176,13 @@ def capture_faces_for_user(user_id, user_name, num_samples=5):
         os.makedirs(user_folder, exist_ok=True)
         cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
         if not cap.isOpened():
-            print("[ERROR] Camera not found.")
+            log.error("camera_not_found", user=user_name)
             return None
 
         count = 0
         image_paths = []
-        print(f"[INFO] Capturing faces for {user_name}...")
+        color_crops = []
+        log.info("capture_started", user=user_name, samples=num_samples)
 
         while True:
             ret, frame = cap.read()
@@ -87,10 +194,12 @@ def capture_faces_for_user(user_id, user_name, num_samples=5):
                 face_crop = frame[y:y + h, x:x + w]
                 if face_crop.size == 0:
                     continue
-                gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
+                color_crops.append(face_crop.copy())
                 count += 1
                 img_path = os.path.join(user_folder, f"{safe_name}_{count}.jpg")
-                cv2.imwrite(img_path, gray)
+                # Colour, so an embedding --rebuild sees what live recognition sees;
+                # LBPH training reads these back as grayscale
+                cv2.imwrite(img_path, face_crop)
                 image_paths.append(img_path.replace("\\", "/"))
 
                 cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
@@ -104,41 +213,52 @@ def capture_faces_for_user(user_id, user_name, num_samples=5):
         cap.release()
         cv2.destroyAllWindows()
 
-        print(f"[DONE] Captured {count} samples for {user_name}.")
+        log.info("capture_done", user=user_name, samples=count)
 
         if count == 0:
-            print("[WARNING] No images captured.")
+            log.warning("no_images_captured", user=user_name)
             shutil.rmtree(user_folder, ignore_errors=True)
             return None
 
-        # Train LBPH model and store locally
-        model_binary, labels_binary, label_map = train_lbph_model()
+        if RECOGNIZER_BACKEND == "sface":
+            # Embed only this user's crops and append them to the index
+            vectors = enroll_user(f"{safe_name}_{user_id}", color_crops)
+            face_data = {
+                "images": image_paths,
+                "embedding_model": "sface",
+                "embeddings": vectors.tolist(),
+                "updated_at": datetime.utcnow().isoformat()
+            }
+        else:
+            # Train LBPH model and store locally
+            model_binary, labels_binary, label_map = train_lbph_model()
+            face_data = {
+                "images": image_paths,
+                "lbph_model_yml": model_binary,
+                "labels_pkl": labels_binary,
+                "label_map": label_map,
+                "updated_at": datetime.utcnow().isoformat()
+            }
 
         # ✅ Store everything inside face_data of the same user
         update_result = mongo.db.users.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {
                 "face_registered": True,
-                "face_data": {
-                    "images": image_paths,
-                    "lbph_model_yml": model_binary,
-                    "labels_pkl": labels_binary,
-                    "label_map": label_map,
-                    "updated_at": datetime.utcnow().isoformat()
-                }
+                "face_data": face_data
             }}
         )
 
         if update_result.modified_count == 0:
-            print("[DB ERROR] MongoDB update failed — deleting dataset folder.")
+            log.error("face_data_not_stored", user=user_name, folder=user_folder)
             shutil.rmtree(user_folder, ignore_errors=True)
             return None
 
-        print(f"[DB] ✅ Face data stored in MongoDB for user {user_name}.")
+        log.info("face_data_stored", user=user_name, images=len(image_paths))
         return user_folder
 
     except Exception as e:
-        print(f"[ERROR] capture_faces_for_user failed: {e}")
+        log.error("capture_failed", user=user_name, error=e)
         shutil.rmtree(user_folder, ignore_errors=True)
         return None
 
@@ -165,7 +285,7 @@ def train_lbph_model():
         label_id += 1
 
     if not faces:
-        print("[WARNING] No faces found for training.")
+        log.warning("no_training_faces", dataset=DATASET_DIR)
         return None, None, {}
 
     recognizer.train(faces, np.array(labels))
@@ -173,7 +293,7 @@ def train_lbph_model():
     with open(LABELS_FILE, "wb") as f:
         pickle.dump(label_map, f)
 
-    print(f"[TRAINED] LBPH Model saved → {MODEL_FILE}")
+    log.info("model_trained", path=MODEL_FILE, people=len(label_map), images=len(faces))
 
     # Read binary content for DB storage
     with open(MODEL_FILE, "rb") as f:
@@ -190,7 +310,7 @@ def train_lbph_model():
 def generate_camera_frames():
     cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
     if not cap.isOpened():
-        print("[ERROR] Cannot open camera.")
+        log.error("camera_open_failed", key="preview_camera", every=10)
         return
 
     while True:
@@ -212,12 +332,17 @@ def is_face_registered(user_id):
         user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
         return bool(user and user.get("face_registered", False))
     except Exception as e:
-        print(f"[ERROR] is_face_registered failed: {e}")
+        log.error("face_lookup_failed", user_id=user_id, error=e, key="face_lookup", every=10)
         return False
 
 
 __all__ = [
     "detect_faces_dnn",
+    "detect_faces_dnn_batch",
+    "load_lbph_recognizer",
+    "load_face_recognizer",
+    "recognize_face_crops",
+    "recognize_frames",
     "capture_faces_for_user",
     "train_lbph_model",
     "generate_camera_frames",
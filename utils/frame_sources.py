@@ -0,0 +1,135 @@
+"""
+utils/frame_sources.py
+----------------------
+Frame sources for the recognition runtime. Every source behaves like
+cv2.VideoCapture: isOpened(), read([dst]) -> (ok, frame), release().
+
+    0, "1"                 local camera index (DirectShow on Windows, V4L2 on Linux)
+    "/dev/video2"          V4L2 device
+    "rtsp://…", "http://…" network stream (FFmpeg)
+    "gate.mp4"             video file
+    "captures/"            directory of images, read in name order
+
+File and directory sources can be paced at `fps` and looped, so the
+service can be load-tested without real cameras. When a finite source
+runs out, its `exhausted` flag is set so a supervisor can tell "done"
+from "failed".
+"""
+
+import os
+import sys
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+STREAM_PREFIXES = ("rtsp://", "rtsps://", "http://", "https://")
+
+
+class _PacedSource:
+    """Shared pacing/looping for finite sources."""
+    exhausted = False
+
+    def __init__(self, fps=None, loop=False):
+        self.fps = fps
+        self.loop = loop
+        self._next = 0.0
+
+    def _pace(self):
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + 1.0 / self.fps
+
+
+class VideoFileSource(_PacedSource):
+    def __init__(self, path, fps=None, loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        # Pace at the file's own frame rate unless told otherwise (0 = as fast as possible)
+        native = self.cap.get(cv2.CAP_PROP_FPS) or None
+        super().__init__(native if fps is None else fps, loop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, dst=None):
+        self._pace()
+        ret, frame = self.cap.read(dst)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(dst)
+        if not ret:
+            self.exhausted = True
+        return ret, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(_PacedSource):
+    def __init__(self, path, fps=None, loop=False):
+        super().__init__(fps, loop)
+        self.path = path
+        self.files = sorted(
+            os.path.join(path, f) for f in os.listdir(path)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self, dst=None):
+        self._pace()
+        while True:
+            if self.index >= len(self.files):
+                if not self.loop or not self.files:
+                    self.exhausted = True
+                    return False, None
+                self.index = 0
+
+            path = self.files[self.index]
+            self.index += 1
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            if dst is not None and dst.shape == frame.shape:
+                dst[...] = frame
+                return True, dst
+            return True, frame
+
+    def release(self):
+        self.files = []
+
+
+def open_frame_source(source, fps=None, loop=False):
+    """
+    Open any supported source (see module docstring).
+    fps/loop only apply to video files and image directories.
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+
+    if isinstance(source, int):
+        if os.name == "nt":
+            return cv2.VideoCapture(source, cv2.CAP_DSHOW)
+        if sys.platform.startswith("linux"):
+            return cv2.VideoCapture(source, cv2.CAP_V4L2)
+        return cv2.VideoCapture(source)
+
+    if source.startswith("/dev/video"):
+        return cv2.VideoCapture(source, cv2.CAP_V4L2)
+
+    if source.lower().startswith(STREAM_PREFIXES):
+        return cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, fps, loop)
+
+    return VideoFileSource(source, fps, loop)
@@ -0,0 +1,168 @@
+"""
+utils/log.py
+------------
+Structured, rate-limited logging for the recognition and enrollment paths.
+
+    log = get_logger("attendance")
+    log.info("repeat", user=name, action=action, key=("repeat", uid), every=60)
+    log.debug("predict", distance=d, sample=0.01)
+
+Every record is an event name plus key=value fields. Two knobs keep hot
+paths quiet:
+
+    key / every   at most one record per `key` every `every` seconds; the
+                  next one that gets through carries suppressed=N
+    sample        keep only this fraction of records (0.0 .. 1.0)
+
+Records are handed to a QueueHandler, so the caller never blocks on
+stdout; a QueueListener thread formats and writes them.
+
+Environment:
+    LOG_LEVEL   DEBUG / INFO (default) / WARNING / ERROR
+    LOG_FORMAT  text (default) or json (one object per line, for shippers)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+ROOT_LOGGER = "facetrack"
+
+
+# ============================
+# FORMATTERS
+# ============================
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        ts = time.strftime("%H:%M:%S", time.localtime(record.created))
+        line = f"{ts} [{record.levelname}] {record.name.split('.')[-1]}: {record.getMessage()}"
+        return f"{line} {fields}" if fields else line
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        doc = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        doc.update(getattr(record, "fields", {}))
+        return json.dumps(doc, default=str)
+
+
+# ============================
+# QUEUE HANDLER (configured once)
+# ============================
+_setup_lock = threading.Lock()
+_listener = None
+_listener_pid = None
+
+
+def _setup():
+    global _listener, _listener_pid
+    with _setup_lock:
+        # A forked child (multi-process pipeline) inherits the handler but not
+        # the listener thread, so it sets up its own
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+
+        q = queue.SimpleQueue()
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(q))
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(q, stream)
+        _listener.start()
+        _listener_pid = os.getpid()
+        # Flush what is queued on exit
+        atexit.register(_listener.stop)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: _listener is not None and _setup())
+
+
+# ============================
+# LOGGER
+# ============================
+class StructuredLogger:
+    def __init__(self, name):
+        self._logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self._last = {}        # key -> (last emit time, suppressed since)
+        self._lock = threading.Lock()
+        self.suppressed = 0
+        self.emitted = 0
+
+    def _allow(self, key, every):
+        """(emit?, records suppressed for this key since the last emit)."""
+        now = time.monotonic()
+        with self._lock:
+            last, skipped = self._last.get(key, (None, 0))
+            if last is not None and now - last < every:
+                self._last[key] = (last, skipped + 1)
+                self.suppressed += 1
+                return False, 0
+            self._last[key] = (now, 0)
+            return True, skipped
+
+    def log(self, level, event, key=None, every=None, sample=None, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample is not None and random.random() >= sample:
+            self.suppressed += 1
+            return
+        if key is not None and every:
+            allowed, skipped = self._allow(key, every)
+            if not allowed:
+                return
+            if skipped:
+                fields["suppressed"] = skipped
+
+        self.emitted += 1
+        self._logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **kw):
+        self.log(logging.DEBUG, event, **kw)
+
+    def info(self, event, **kw):
+        self.log(logging.INFO, event, **kw)
+
+    def warning(self, event, **kw):
+        self.log(logging.WARNING, event, **kw)
+
+    def error(self, event, **kw):
+        self.log(logging.ERROR, event, **kw)
+
+    def stats(self):
+        return {"emitted": self.emitted, "suppressed": self.suppressed}
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    """Shared StructuredLogger for `name` (e.g. "attendance", "enroll")."""
+    _setup()
+    with _setup_lock:
+        if name not in _loggers:
+            _loggers[name] = StructuredLogger(name)
+        return _loggers[name]
+
+
+__all__ = ["StructuredLogger", "get_logger"]
@@ -1,295 +1,789 @@
 import os
 import cv2
 import pickle
+import queue
+import threading
+import time
+import argparse
 import numpy as np
-from datetime import datetime, timedelta, timezone
-from pymongo import MongoClient
-from bson import ObjectId
+from collections import Counter
+from datetime import datetime, timedelta
+from utils.attendance_cache import AttendanceStateCache
+from utils.attendance_rules import IST
+from utils.attendance_writer import AttendanceWriter, apply_attendance_batch
+from utils.camera_config import get_camera_config
+from utils.db import get_runtime_db
+from utils.detectors import create_detector
+from utils.embeddings import (DEFAULT_RECOGNIZER_BACKEND, EMBEDDINGS_FILE, EmbeddingIndex,
+                              load_embedding_recognizer)
+from utils.event_journal import EventJournal, JournalReplayer
+from utils.frame_sources import IMAGE_EXTENSIONS, open_frame_source
+from utils.log import get_logger
+from utils.metrics import get_metrics, start_metrics_export
+from utils.motion_gate import MotionGate
+from utils.pipeline import RecognitionPipeline
+from utils.rate_controller import AdaptiveRateController
+from utils.roi import RegionOfInterest
+from utils.tracker import FaceTracker, assign_identities
+from utils.user_directory import UserDirectory
 
 # ============================
 # CONFIG
 # ============================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PROTO = os.path.join(BASE_DIR, "deploy.prototxt")
-MODEL_WEIGHTS = os.path.join(BASE_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
 MODEL_FILE = os.path.join(BASE_DIR, "..", "lbph_model.yml")
 LABELS_FILE = os.path.join(BASE_DIR, "..", "labels.pkl")
 
-MONGO_URI = "mongodb://localhost:27017/"
-DB_NAME = "AttendanceSystem"
+# "lbph" or "sface" ($FACE_RECOGNIZER_BACKEND, utils/embeddings.py); the
+# live loop reloads when RECOGNIZER_FILE changes (retrain / enrollment)
+RECOGNIZER_BACKEND = DEFAULT_RECOGNIZER_BACKEND
+RECOGNIZER_FILE = EMBEDDINGS_FILE if RECOGNIZER_BACKEND == "sface" else MODEL_FILE
+LBPH_MATCH_DISTANCE = 70
+DISTANCE_METRIC = f"{RECOGNIZER_BACKEND}_distance"
 
-MIN_DURATION_MINUTES = 5
 CONFIDENCE_THRESHOLD = 0.40
 
-# Proper timezone-aware IST
-IST = timezone(timedelta(hours=5, minutes=30))
+# Pipeline queue sizes (frames drop-oldest when full; events block, never drop)
+FRAME_QUEUE_SIZE = 1
+EVENT_QUEUE_SIZE = 64
+STATS_INTERVAL_SECONDS = 10
 
-FACE_NET = cv2.dnn.readNetFromCaffe(MODEL_PROTO, MODEL_WEIGHTS)
+# Motion gate: skip the DNN on idle frames, but force a detection this often
+MOTION_GATE_ENABLED = True
+MOTION_FORCE_INTERVAL_SECONDS = 2.0
 
+# Tracking: an identity must win TRACK_MIN_VOTES of the last TRACK_VOTE_WINDOW
+# predictions before attendance is marked (once per track)
+TRACK_VOTE_WINDOW = 5
+TRACK_MIN_VOTES = 3
+TRACK_MAX_AGE_SECONDS = 1.0
+# Tracks must outlive the longest gap between detections (forced motion-gate
+# detections, rate-controller skipped frames), or a person standing still
+# never collects enough votes
+TRACK_AGE_GAP_MARGIN = 1.5
 
-# ============================
-# UTILITIES
-# ============================
-def _parse_time_str(tstr):
-    for fmt in ("%H:%M:%S", "%H:%M"):
-        try:
-            return datetime.strptime(tstr, fmt)
-        except ValueError:
-            continue
-    raise ValueError(f"Bad time: {tstr}")
+# Rate controller: keep capture → result latency under this budget
+LATENCY_TARGET_SECONDS = 0.25
+MAX_PROCESS_FPS = 15.0
 
+# Reuse frame / grayscale / blob buffers instead of allocating per frame
+ALLOCATION_FREE = True
 
-def _minutes_between(t1, t2):
-    # Convert string times to datetime objects (same day)
-    d1 = _parse_time_str(t1)
-    d2 = _parse_time_str(t2)
+# Offline batch mode: decoded frames waiting for recognition
+DECODE_QUEUE_SIZE = 32
 
-    today = datetime.now(IST).date()
-    d1 = d1.replace(year=today.year, month=today.month, day=today.day)
-    d2 = d2.replace(year=today.year, month=today.month, day=today.day)
+# Live events go to a local journal first and are replayed to MongoDB in batches
+JOURNAL_BATCH_SIZE = 200
 
-    # Midnight wrap
-    if d2 < d1:
-        d2 += timedelta(days=1)
+# Async writer (recordings, multi-process mode): flush every N events or M ms
+WRITER_MAX_BATCH = 100
+WRITER_MAX_DELAY_MS = 200
 
-    return int((d2 - d1).total_seconds() / 60)
+# Label → user directory: users re-read this often; the model file is
+# checked for retraining this often
+USER_DIRECTORY_REFRESH_SECONDS = 60
+MODEL_CHECK_INTERVAL_SECONDS = 10
 
+# Backend is chosen per deployment with $FACE_DETECTOR_BACKEND (utils/detectors.py)
+FACE_DETECTOR = create_detector(conf_threshold=CONFIDENCE_THRESHOLD)
 
-def _format_dur(m):
-    h, mm = divmod(int(m), 60)
-    return f"{h}h {mm}m"
+# Last check-in/out per (user, date): repeats are answered without MongoDB
+ATTENDANCE_CACHE = AttendanceStateCache()
+
+# "Already Present" / "not marked" lines: at most one per user this often
+REPEAT_LOG_INTERVAL_SECONDS = 60
+
+log = get_logger("attendance")
 
 
 # ============================
 # FACE DETECTION (DNN)
 # ============================
-def detect_faces_dnn(frame, conf_threshold=CONFIDENCE_THRESHOLD):
-    h, w = frame.shape[:2]
-    blob = cv2.dnn.blobFromImage(
-        cv2.resize(frame, (300, 300)),
-        1.0,
-        (300, 300),
-        (104.0, 177.0, 123.0)
-    )
-    FACE_NET.setInput(blob)
-    detections = FACE_NET.forward()
+def detect_faces_dnn(frame, conf_threshold=CONFIDENCE_THRESHOLD, input_size=None,
+                     buffers=None):
+    """buffers: optional FACE_DETECTOR.make_buffers() result (its size wins over input_size)."""
+    if buffers is not None:
+        return FACE_DETECTOR.detect_into(frame, buffers, conf_threshold)
+    return FACE_DETECTOR.detect(frame, conf_threshold, input_size)
 
-    boxes = []
-    for i in range(detections.shape[2]):
-        confidence = float(detections[0, 0, i, 2])
-        if confidence > conf_threshold:
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (x1, y1, x2, y2) = box.astype("int")
-            boxes.append((x1, y1, x2-x1, y2-y1, confidence))
 
-    return boxes
+def detect_faces_dnn_batch(frames, conf_threshold=CONFIDENCE_THRESHOLD):
+    """One forward pass for several frames (e.g. one per camera); boxes per frame."""
+    return FACE_DETECTOR.detect_batch(frames, conf_threshold)
 
 
 # ============================
-# MARK ATTENDANCE
+# MODEL LOADING
 # ============================
-def mark_attendance_in_db(user_id, user_name):
-    try:
-        client = MongoClient(MONGO_URI)
-        db = client[DB_NAME]
-
-        # ---------------------------
-        # GET USER & INSTITUTE FROM DB
-        # ---------------------------
-        user = db.users.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            print("[ERROR] User not found in DB")
-            return "Error"
-
-        # Get institute_id as STRING
-        institute_id = str(user.get("institute_id", ""))
-
-        # ---------------------------
-        # DATE / TIME
-        # ---------------------------
-        now_ist = datetime.now(IST)
-        today = now_ist.strftime("%Y-%m-%d")
-        current_time = now_ist.strftime("%H:%M")
-
-        # ATTENDANCE EXIST?
-        rec = db.attendances.find_one({
-            "user_id": str(user_id),
-            "date": today
-        })
-
-        # ---------------------------
-        # FIRST ENTRY → CHECK-IN
-        # ---------------------------
-        if not rec:
-            entry = {
-                "time_in": current_time,
-                "time_out": None,
-                "duration": None,
-                "label": "Check-In"
-            }
-
-            db.attendances.insert_one({
-                "user_id": str(user_id),
-                "institute_id": institute_id,
-                "date": today,
-                "entries": [entry],
-                "status": "present",
-                "marked_by": "LBPH System",
-                "created_at": now_ist,
-                "updated_at": now_ist
-            })
-
-            print(f"[NEW] {user_name} | Check-In {current_time}")
-            return "Check-In"
-
-        # ---------------------------
-        # OTHER ENTRIES
-        # ---------------------------
-        entries = rec.get("entries", [])
-        last = entries[-1] if entries else None
-
-        # No last entry → add check-in
-        if not last:
-            entries.append({
-                "time_in": current_time,
-                "time_out": None,
-                "duration": None,
-                "label": "Check-In"
-            })
-            db.attendances.update_one(
-                {"_id": rec["_id"]},
-                {"$set": {"entries": entries, "updated_at": now_ist}}
-            )
-            print(f"[ADD] {user_name} | Check-In {current_time}")
-            return "Check-In"
-
-        # Last entry has no time_out → CHECK-OUT
-        if last.get("time_out") is None:
-            diff = _minutes_between(last["time_in"], current_time)
-
-            if diff < MIN_DURATION_MINUTES:
-                print(f"[REPEAT] {user_name} | Already Present ({diff}m)")
-                return f"Already Present ({diff}m)"
-
-            last["time_out"] = current_time
-            last["duration"] = _format_dur(diff)
-            last["label"] = "Check-Out"
-
-            entries[-1] = last
-            db.attendances.update_one(
-                {"_id": rec["_id"]},
-                {"$set": {"entries": entries, "updated_at": now_ist}}
-            )
-            print(f"[OUT] {user_name} | Check-Out {current_time}")
-            return "Check-Out"
-
-        # Last entry closed → NEW CHECK-IN
-        last_out = last.get("time_out")
-        diff = _minutes_between(last_out, current_time)
-
-        if diff < MIN_DURATION_MINUTES:
-            print(f"[REPEAT] {user_name} | Already Present ({diff}m)")
-            return f"Already Present ({diff}m)"
-
-        entries.append({
-            "time_in": current_time,
-            "time_out": None,
-            "duration": None,
-            "label": "Check-In"
-        })
-
-        db.attendances.update_one(
-            {"_id": rec["_id"]},
-            {"$set": {"entries": entries, "updated_at": now_ist}}
-        )
+def _recognizer_labels():
+    """"name_uid" -> label id of the configured backend's model."""
+    if RECOGNIZER_BACKEND == "sface":
+        return EmbeddingIndex.load(EMBEDDINGS_FILE).label_map
+    with open(LABELS_FILE, "rb") as f:
+        return pickle.load(f)
+
+
+def load_user_directory(sync_users=True, labels=None):
+    """
+    UserDirectory for `labels` (default: the configured recognizer's labels).
+    With sync_users it is filled from the users collection and kept fresh on
+    a background thread.
+    """
+    if labels is None:
+        labels = _recognizer_labels()
+
+    directory = UserDirectory(labels)
+    if sync_users:
+        directory.start_auto_refresh(get_runtime_db, USER_DIRECTORY_REFRESH_SECONDS)
+    return directory
+
+
+def load_recognizer(sync_users=True):
+    """
+    Load the configured recognizer (LBPH model or embedding index) and its
+    user directory; returns (None, None) if nothing is trained / enrolled.
+    """
+    if RECOGNIZER_BACKEND == "sface":
+        recognizer = load_embedding_recognizer(EMBEDDINGS_FILE)
+        if recognizer is None:
+            log.error("no_model", path=EMBEDDINGS_FILE)
+            return None, None
+        return recognizer, load_user_directory(sync_users, recognizer.label_map)
+
+    if not os.path.exists(MODEL_FILE):
+        log.error("no_model", path=MODEL_FILE)
+        return None, None
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(MODEL_FILE)
+    return recognizer, load_user_directory(sync_users)
 
-        print(f"[IN] {user_name} | New Check-In {current_time}")
-        return "Check-In"
 
-    except Exception as e:
-        print("DB Error:", e)
-        return "Error"
+# ============================
+# JOURNALED ATTENDANCE (live loops)
+# ============================
+_journal_lock = threading.Lock()
+_journal = None
+_replayer = None
+
+# Latest replayed action per user, for on-screen labels
+APPLIED_ACTIONS = {}
+
+
+def replay_attendance_events(rows):
+    """
+    JournalReplayer batch: apply journaled events and their sightings.
+    Raises while MongoDB is unreachable so rows are kept.
+    """
+    events = [(uid, name, datetime.fromisoformat(event_time), camera_id, distance, institute_id,
+               bool(sighting_only))
+              for (_, uid, name, camera_id, event_time, distance, institute_id, sighting_only) in rows]
+    actions, days = apply_attendance_batch(get_runtime_db(), events)
+    # Confirmed state, including days the DB answered as repeats
+    ATTENDANCE_CACHE.remember_days(days)
+    for (uid, name, event_time, camera_id, *_), action in zip(events, actions):
+        if action is None:  # sighting only
+            continue
+        APPLIED_ACTIONS[uid] = action
+        repeat = action.startswith("Already Present")
+        log.info("replay", user=name, action=action, time=event_time.strftime("%H:%M"),
+                 camera=camera_id or "-", key=("repeat", uid) if repeat else None,
+                 every=REPEAT_LOG_INTERVAL_SECONDS)
+
+
+
+def start_attendance_journal():
+    """Open the journal and start its replayer once per process."""
+    global _journal, _replayer
+    with _journal_lock:
+        if _replayer is None:
+            _journal = EventJournal()
+            _replayer = JournalReplayer(_journal, replay_attendance_events,
+                                        batch_size=JOURNAL_BATCH_SIZE).start()
+            pending = _journal.pending()
+            if pending:
+                log.info("journal_backlog", pending=pending)
+        return _replayer
+
+
+def stop_attendance_journal():
+    global _journal, _replayer
+    with _journal_lock:
+        if _replayer is not None:
+            _replayer.stop()
+            _journal.close()
+            _journal = _replayer = None
+
+
+def journal_attendance_event(user_id, user_name, camera_id=None, distance=None, event_time=None,
+                             institute_id=None):
+    """
+    Pipeline writer: record locally and return at once; MongoDB is written by
+    the replayer. Known repeats (ATTENDANCE_CACHE) are answered here and
+    journaled as sightings only.
+    """
+    event_time = event_time or datetime.now(IST)
+    repeat = ATTENDANCE_CACHE.check(user_id, event_time)
+
+    start_attendance_journal()
+    _journal.append(user_id, user_name, event_time, camera_id, distance, institute_id,
+                    sighting_only=bool(repeat))
+    return repeat or APPLIED_ACTIONS.get(user_id, "Recorded")
 
 
 # ============================
-# FACE RECOGNITION LOOP
+# ASYNC BATCHED WRITER (recordings, multi-process)
 # ============================
-def mark_face_recognition():
-    try:
-        if not os.path.exists(MODEL_FILE):
-            print("[ERROR] No LBPH model found.")
+_writer = None
+
+
+def get_attendance_writer():
+    """Process-wide AttendanceWriter on the shared pooled client, started on first use."""
+    global _writer
+    with _journal_lock:
+        if _writer is None:
+            _writer = AttendanceWriter(get_runtime_db, max_batch=WRITER_MAX_BATCH,
+                                       max_delay_ms=WRITER_MAX_DELAY_MS,
+                                       on_days=ATTENDANCE_CACHE.remember_days).start()
+        return _writer
+
+
+def queue_attendance_event(user_id, user_name, event_time=None, camera_id=None, distance=None,
+                           institute_id=None):
+    """
+    Hand an event to the writer; returns the cached repeat action (the event
+    is then queued as a sighting only), or None if queued for attendance.
+    """
+    event_time = event_time or datetime.now(IST)
+    repeat = ATTENDANCE_CACHE.check(user_id, event_time)
+    get_attendance_writer().submit(user_id, user_name, event_time, camera_id, distance, institute_id,
+                                   sighting_only=bool(repeat))
+    return repeat
+
+
+def close_attendance_writer():
+    """Flush and stop the writer; returns its final stats (None if never started)."""
+    global _writer
+    with _journal_lock:
+        if _writer is None:
+            return None
+        _writer.close()
+        stats = _writer.stats()
+        log.info("writer_closed", **stats)
+        _writer = None
+        return stats
+
+
+# ============================
+# PER-FRAME RECOGNITION
+# ============================
+def _match(predicted_id, confv, recognizer, directory):
+    # KNOWN USER (each backend has its own distance scale)
+    if confv < getattr(recognizer, "match_distance", LBPH_MATCH_DISTANCE):
+        entry = directory.get(predicted_id)
+        if entry:
+            return entry.user_id, entry.name, confv
+
+    # UNKNOWN USER
+    return None, None, confv
+
+
+def predict_face(roi, recognizer, directory):
+    """Predict one face crop; returns (user_id, name, distance), ids None if unknown."""
+    predicted_id, confv = recognizer.predict(roi)
+    return _match(predicted_id, confv, recognizer, directory)
+
+
+def _observe_matches(metrics, matches):
+    for uid, _, confv in matches:
+        metrics.observe_value(DISTANCE_METRIC, confv)
+        metrics.incr("predictions")
+        if uid is None:
+            metrics.incr("unknown")
+
+
+def _observed_predict(roi, recognizer, directory, metrics):
+    """predict_face() that also records timing, distance and unknown rate."""
+    if metrics is None:
+        return predict_face(roi, recognizer, directory)
+
+    started = time.perf_counter()
+    match = predict_face(roi, recognizer, directory)
+    metrics.observe("predict", time.perf_counter() - started)
+    _observe_matches(metrics, [match])
+    return match
+
+
+def _predict_rois(rois, recognizer, directory, metrics):
+    """All crops of a frame; embedding backends identify them with one matrix multiply."""
+    if not hasattr(recognizer, "predict_batch"):
+        return [_observed_predict(roi, recognizer, directory, metrics) for roi in rois]
+
+    started = time.perf_counter()
+    matches = [_match(label, confv, recognizer, directory)
+               for label, confv in recognizer.predict_batch(rois)]
+    if metrics is not None and rois:
+        metrics.observe("predict_batch", time.perf_counter() - started)
+        _observe_matches(metrics, matches)
+    return matches
+
+
+def _crop_source(frame, recognizer, gray_buf, metrics):
+    """Image the crops are cut from: BGR for embedding backends, grayscale for LBPH."""
+    if getattr(recognizer, "color_input", False):
+        return frame
+    return _gray(frame, gray_buf, metrics)
+
+
+def _gray(frame, gray_buf, metrics):
+    if metrics is None:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray_buf)
+    started = time.perf_counter()
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray_buf)
+    metrics.observe("gray", time.perf_counter() - started)
+    return gray
+
+
+def recognize_faces(frame, recognizer, directory, faces=None, gray_buf=None, metrics=None):
+    """
+    Identify faces; returns (x, y, w, h, user_id, name, distance) tuples.
+    `faces` are pre-computed detector boxes, detected here when omitted;
+    `gray_buf` is an optional preallocated grayscale frame to convert into.
+    """
+    image = _crop_source(frame, recognizer, gray_buf, metrics)
+    if faces is None:
+        faces = detect_faces_dnn(frame)
+
+    boxes, rois = [], []
+    for (x, y, w, h, conf) in faces:
+        roi = image[y:y+h, x:x+w]
+        if roi.size == 0:
+            continue
+        boxes.append((x, y, w, h))
+        rois.append(roi)
+
+    return [(*box, *match) for box, match in zip(boxes, _predict_rois(rois, recognizer, directory, metrics))]
+
+
+def track_faces(frame, recognizer, directory, tracker, faces=None, gray_buf=None, now=None,
+                metrics=None):
+    """
+    Like recognize_faces, but only predicts for unconfirmed tracks.
+    Returns (results, events); events holds (user_id, name, distance) for tracks
+    confirmed on this frame, so each visit is marked exactly once.
+    """
+    if faces is None:
+        faces = detect_faces_dnn(frame)
+
+    image = None
+
+    def predict(box):
+        nonlocal image
+        if image is None:
+            image = _crop_source(frame, recognizer, gray_buf, metrics)
+        x, y, w, h = box
+        return _observed_predict(image[y:y+h, x:x+w], recognizer, directory, metrics)
+
+    results, events = assign_identities(tracker, faces, predict, now)
+    return [r[:7] for r in results], events
+
+
+def new_tracker():
+    return FaceTracker(max_age=TRACK_MAX_AGE_SECONDS, vote_window=TRACK_VOTE_WINDOW,
+                       min_votes=TRACK_MIN_VOTES)
+
+
+class FrameProcessor:
+    """
+    Per-camera process(frame) -> (results, events) callable for RecognitionPipeline.
+
+    Optional helpers, each kept per camera:
+      camera     – CameraConfig; ROI polygon and detector input scale
+      gate       – MotionGate; idle frames yield no faces
+      tracker    – FaceTracker; otherwise every recognized face is an event
+      (events for users the directory marks inactive are dropped here)
+      controller – AdaptiveRateController; sets detection interval and input scale
+      detector   – FaceDetector for this camera (default: the shared FACE_DETECTOR);
+                   give each camera its own when several run in one process
+      metrics    – StageMetrics (utils/metrics.py); detect / gray / predict
+                   timings, faces per frame, match distances, unknown rate
+
+    With reuse_buffers=True the grayscale frame and detector input (SSD blob)
+    are written into arrays kept on this object instead of being allocated
+    per frame.
+    """
+
+    def __init__(self, recognizer, directory, camera=None, gate=None, tracker=None, controller=None,
+                 reuse_buffers=False, detector=None, metrics=None):
+        self.recognizer = recognizer
+        self.directory = directory
+        self.camera = camera
+        self.roi = RegionOfInterest(camera.roi if camera else None)
+        self.gate = gate
+        self.tracker = tracker
+        self.controller = controller
+        self.reuse_buffers = reuse_buffers
+        self.detector = detector or FACE_DETECTOR
+        self.metrics = metrics
+        if metrics is not None and self.detector.metrics is None:
+            self.detector.metrics = metrics
+        self._detector_buffers = {}
+        self._gray = None
+        self._last_results = []
+        self._model_mtime = os.path.getmtime(RECOGNIZER_FILE) if os.path.exists(RECOGNIZER_FILE) else None
+        self._model_checked = time.monotonic()
+
+    def _maybe_reload_model(self):
+        """Pick up a retrained model (and its labels) without restarting."""
+        now = time.monotonic()
+        if now - self._model_checked < MODEL_CHECK_INTERVAL_SECONDS:
+            return
+        self._model_checked = now
+        try:
+            mtime = os.path.getmtime(RECOGNIZER_FILE)
+        except OSError:
+            return
+        if mtime == self._model_mtime:
             return
 
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(MODEL_FILE)
+        recognizer, directory = load_recognizer()
+        if recognizer is None:
+            return
+        old = self.directory
+        self.recognizer, self.directory, self._model_mtime = recognizer, directory, mtime
+        if self.tracker is not None:
+            self.tracker.tracks = []  # label ids changed; confirmed identities are stale
+        old.stop()
+        log.info("model_reloaded", path=RECOGNIZER_FILE)
+
+    def _active_events(self, events):
+        active = []
+        for event in events:
+            if self.directory.is_active(event[0]):
+                active.append(event)
+            else:
+                log.info("inactive", user=event[1], key=("inactive", event[0]),
+                         every=REPEAT_LOG_INTERVAL_SECONDS)
+        return active
+
+    def _track_max_age(self):
+        """
+        How long a track may go unseen: at least TRACK_AGE_GAP_MARGIN detection
+        gaps. The gate is only consulted on frames the controller lets through,
+        so their gaps add up.
+        """
+        gap = self.gate.force_interval if self.gate is not None else 0.0
+        if self.controller is not None:
+            gap += self.controller.detection_gap()
+        return max(TRACK_MAX_AGE_SECONDS, TRACK_AGE_GAP_MARGIN * gap)
+
+    def _input_size(self):
+        scale = self.camera.input_scale if self.camera else 1.0
+        if self.controller is not None:
+            scale *= self.controller.scale
+        return self.detector.scaled_input_size(scale)
+
+    def __call__(self, frame, now=None):
+        """now: frame time in seconds for recordings; live cameras use the clock."""
+        self._maybe_reload_model()
+
+        # Between detections keep showing the last boxes, but emit nothing
+        if self.controller is not None and not self.controller.should_detect():
+            if self.metrics is not None:
+                self.metrics.incr("skipped_frames")
+            return self._last_results, []
+
+        # Everything outside the ROI is ignored, including motion
+        crop, offset = self.roi.crop(frame)
+
+        if self.gate is not None and not self.gate.should_detect(crop, now):
+            if self.metrics is not None:
+                self.metrics.incr("idle_frames")
+            self._last_results = []
+            return [], []
+
+        input_size = self._input_size()
+        buffers = gray_buf = None
+        if self.reuse_buffers:
+            if input_size not in self._detector_buffers:
+                self._detector_buffers[input_size] = self.detector.make_buffers(input_size)
+            buffers = self._detector_buffers[input_size]
+            if self._gray is None or self._gray.shape != frame.shape[:2]:
+                self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            gray_buf = self._gray
+
+        started = time.perf_counter()
+        if buffers is not None:
+            faces = self.detector.detect_into(crop, buffers, CONFIDENCE_THRESHOLD)
+        else:
+            faces = self.detector.detect(crop, CONFIDENCE_THRESHOLD, input_size)
+        faces = self.roi.map_boxes(faces, offset)
+        if self.metrics is not None:
+            self.metrics.observe("detect", time.perf_counter() - started)
+            self.metrics.observe_value("faces_per_frame", len(faces), scale=1)
+            self.metrics.incr("faces", len(faces))
+
+        if self.tracker is not None:
+            self.tracker.max_age = self._track_max_age()
+            results, events = track_faces(frame, self.recognizer, self.directory, self.tracker, faces,
+                                          gray_buf, now, self.metrics)
+        else:
+            results = recognize_faces(frame, self.recognizer, self.directory, faces, gray_buf,
+                                      self.metrics)
+            events = [(r[4], r[5], r[6]) for r in results if r[4]]
+
+        if events:
+            events = self._active_events(events)
+            if self.metrics is not None:
+                self.metrics.incr("events", len(events))
+        self._last_results = results
+        return results, events
+
+    def stats(self):
+        stats = {}
+        if self.gate is not None:
+            stats["motion_gate"] = self.gate.stats()
+        if self.tracker is not None:
+            stats["tracker"] = self.tracker.stats()
+        stats["directory"] = self.directory.stats()
+        return stats
+
+    def close(self):
+        """Stop the user directory's refresh thread (the current one, after reloads)."""
+        self.directory.stop()
+
+
+def draw_results(frame, results, actions):
+    for (x, y, w, h, uid, name, confv) in results:
+        if name:
+            color = (0, 255, 0)
+            label = f"{name} - {actions.get(uid, '...')}"
+        else:
+            label = "Unknown"
+            color = (0, 0, 255)
+
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+        cv2.putText(
+            frame,
+            label,
+            (x, y - 10),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.7,
+            color,
+            2
+        )
 
-        with open(LABELS_FILE, "rb") as f:
-            labels = pickle.load(f)
 
-        rev = {v: k for k, v in labels.items()}
+# ============================
+# PER-CAMERA PIPELINE
+# ============================
+def _institute_of(processor, user_id):
+    """institute_id from the processor's directory, None if not synced yet."""
+    entry = processor.directory.user(user_id)
+    return entry.institute_id if entry else None
+
+
+def create_camera_pipeline(camera, cap, recognizer, directory, detector=None):
+    """
+    Wire a frame source to a RecognitionPipeline with this camera's ROI,
+    motion gate, tracker, rate controller and metrics (utils/metrics.py).
+    Returns (pipeline, processor); the pipeline is not started yet.
+    """
+    gate = MotionGate(force_interval=MOTION_FORCE_INTERVAL_SECONDS) if MOTION_GATE_ENABLED else None
+    controller = AdaptiveRateController(latency_target=LATENCY_TARGET_SECONDS,
+                                        max_fps=MAX_PROCESS_FPS)
+    metrics = get_metrics(camera.camera_id)
+    processor = FrameProcessor(recognizer, directory, camera, gate, new_tracker(), controller,
+                               reuse_buffers=ALLOCATION_FREE, detector=detector, metrics=metrics)
+
+    start_attendance_journal()
+    pipeline = RecognitionPipeline(
+        cap,
+        process=processor,
+        write=lambda uid, name, distance: journal_attendance_event(
+            uid, name, camera.camera_id, distance, institute_id=_institute_of(processor, uid)),
+        frame_queue_size=FRAME_QUEUE_SIZE,
+        event_queue_size=EVENT_QUEUE_SIZE,
+        controller=controller,
+        reuse_frames=ALLOCATION_FREE,
+        metrics=metrics,
+    )
+    start_metrics_export()
+    return pipeline, processor
+
 
-        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+# ============================
+# FACE RECOGNITION LOOP
+# ============================
+def mark_face_recognition(camera_id="local"):
+    """
+    Live recognition with an on-screen preview.
+
+    Source, ROI and detector input scale come from the `camera_id` entry in
+    cameras.json (see utils/camera_config.py); defaults to webcam 0 and the
+    full frame. For cameras without a desktop session use the headless
+    service in utils/recognition_service.py.
+
+    Capture, detection/recognition and the journal write each run on their
+    own thread (see utils/pipeline.py); this thread only draws and displays.
+    Journaled events reach MongoDB through the replayer (utils/event_journal.py).
+    """
+    try:
+        recognizer, directory = load_recognizer()
+        if recognizer is None:
+            return
+
+        camera = get_camera_config(camera_id)
+        cap = open_frame_source(camera.source, camera.fps, camera.loop)
         if not cap.isOpened():
-            print("[ERROR] Cannot open camera.")
+            log.error("camera_open_failed", camera=camera_id)
             return
 
-        print("[INFO] LBPH Recognition Started (ESC to exit)")
+        pipeline, processor = create_camera_pipeline(camera, cap, recognizer, directory)
+        pipeline.start()
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        log.info("recognition_started", camera=camera_id, hint="ESC to exit")
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = detect_faces_dnn(frame)
+        last_report = time.monotonic()
+        while pipeline.is_running():
+            item = pipeline.next_result(timeout=0.1)
+            if item is not None:
+                _, _, frame, results = item
+                draw_results(frame, results, APPLIED_ACTIONS)
+                cv2.imshow("LBPH Attendance", frame)
+                pipeline.release_result(item)
 
-            for (x, y, w, h, conf) in faces:
-                roi = gray[y:y+h, x:x+w]
-                if roi.size == 0:
-                    continue
+            if cv2.waitKey(1) == 27:
+                break
 
-                predicted_id, confv = recognizer.predict(roi)
+            if time.monotonic() - last_report >= STATS_INTERVAL_SECONDS:
+                log.info("stats", **{**pipeline.stats(), **processor.stats(),
+                                     "journal": _replayer.stats(),
+                                     "attendance_cache": ATTENDANCE_CACHE.stats(),
+                                     "log": log.stats()})
+                last_report = time.monotonic()
 
-                # KNOWN USER
-                if confv < 70:
-                    full = rev.get(predicted_id)
-                    if not full:
-                        continue
+        pipeline.stop()
+        processor.close()
+        cap.release()
+        cv2.destroyAllWindows()
+        stop_attendance_journal()
 
-                    name, uid = (full.rsplit("_", 1) + [None])[:2]
-                    uid = str(ObjectId(uid)) if uid else None
+    except Exception as e:
+        log.error("recognition_failed", error=e)
 
-                    action = mark_attendance_in_db(uid, name)
-                    color = (0, 255, 0)
-                    label = f"{name} - {action}"
 
-                # UNKNOWN USER
-                else:
-                    label = "Unknown"
-                    color = (0, 0, 255)
+# ============================
+# OFFLINE BATCH (RECORDINGS)
+# ============================
+def _recording_frames(path, stride, start_time=None):
+    """
+    Yield (event_time, frame) for every `stride`-th frame of a video file or
+    image folder. Video frame times are start_time + frame offset (start_time
+    defaults to the file's mtime minus its duration); images use their mtime.
+    """
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for name in files[::stride]:
+            file_path = os.path.join(path, name)
+            frame = cv2.imread(file_path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield datetime.fromtimestamp(os.path.getmtime(file_path), IST), frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open recording: {path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    if start_time is None:
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        start_time = datetime.fromtimestamp(os.path.getmtime(path) - duration, IST)
+
+    index = 0
+    try:
+        while True:
+            # grab() skips the colour conversion for frames we don't use
+            if index % stride:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield start_time + timedelta(seconds=index / fps), frame
+            index += 1
+    finally:
+        cap.release()
 
-                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                cv2.putText(
-                    frame,
-                    label,
-                    (x, y - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.7,
-                    color,
-                    2
-                )
 
-            cv2.imshow("LBPH Attendance", frame)
+def mark_attendance_from_recording(path, stride=5, start_time=None, camera_id="local"):
+    """
+    Compute attendance from a recorded video file or image folder, faster
+    than real time. Frames are decoded on a separate thread; recognition runs
+    flat out here and each event is stamped with its frame time, not the clock.
+    """
+    recognizer, directory = load_recognizer()
+    if recognizer is None:
+        return None
 
-            if cv2.waitKey(1) == 27:
-                break
+    gate = MotionGate(force_interval=MOTION_FORCE_INTERVAL_SECONDS) if MOTION_GATE_ENABLED else None
+    processor = FrameProcessor(recognizer, directory, get_camera_config(camera_id), gate, new_tracker())
 
-        cap.release()
-        cv2.destroyAllWindows()
+    frames = queue.Queue(maxsize=DECODE_QUEUE_SIZE)
 
-    except Exception as e:
-        print("[ERROR] Recognition:", e)
+    def decode():
+        try:
+            for item in _recording_frames(path, stride, start_time):
+                frames.put(item)
+        except Exception as e:
+            log.error("decode_failed", path=path, error=e)
+        finally:
+            frames.put(None)
+
+    threading.Thread(target=decode, name="recording-decoder", daemon=True).start()
+    log.info("batch_started", path=path, stride=stride)
+
+    n_frames = 0
+    actions = Counter()
+    started = time.perf_counter()
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        event_time, frame = item
+        n_frames += 1
+
+        _, events = processor(frame, now=event_time.timestamp())
+        for uid, name, distance in events:
+            if queue_attendance_event(uid, name, event_time, camera_id, distance,
+                                      _institute_of(processor, uid)):
+                actions["Already Present"] += 1
+
+    processor.close()
+    writer_stats = close_attendance_writer()
+    if writer_stats:
+        actions.update(writer_stats["actions"])
+
+    elapsed = time.perf_counter() - started
+    fps = n_frames / elapsed if elapsed > 0 else 0.0
+    log.info("batch_done", frames=n_frames, seconds=round(elapsed, 1), fps=round(fps, 1),
+             events=dict(actions))
+    return {"frames": n_frames, "seconds": elapsed, "fps": fps, "events": dict(actions)}
 
 
 if __name__ == "__main__":
-    mark_face_recognition()
+    parser = argparse.ArgumentParser(description="LBPH attendance recognition")
+    parser.add_argument("--camera", default="local", help="camera id in cameras.json")
+    parser.add_argument("--recording", help="video file or image folder to process offline")
+    parser.add_argument("--stride", type=int, default=5, help="process every Nth recorded frame")
+    parser.add_argument("--start", help="recording start time, ISO format (default: from file mtime)")
+    args = parser.parse_args()
+
+    if args.recording:
+        start = datetime.fromisoformat(args.start) if args.start else None
+        if start is not None and start.tzinfo is None:
+            start = start.replace(tzinfo=IST)
+        mark_attendance_from_recording(args.recording, max(1, args.stride), start, args.camera)
+    else:
+        mark_face_recognition(args.camera)
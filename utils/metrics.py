@@ -0,0 +1,310 @@
+"""
+utils/metrics.py
+----------------
+Per-camera latency and throughput metrics for the recognition runtime.
+
+Each camera gets a StageMetrics (get_metrics(camera_id)) holding:
+
+    stages    latency histogram per stage: capture, blob, forward, detect,
+              gray, predict (predict_batch for embedding backends), process,
+              write, latency (capture → result)
+    values    value histograms: faces_per_frame, <backend>_distance
+              (lbph_distance / sface_distance)
+    counters  frames, faces, predictions, unknown, events, ...
+
+Histograms are HDR-style: log-linear buckets with 16 sub-buckets per
+power of two (~6% relative error), fixed memory and O(1) record().
+
+Export (both optional, started by start_metrics_export()):
+    METRICS_PORT   GET http://127.0.0.1:<port>/metrics → JSON of all cameras
+    METRICS_FILE   the same JSON rewritten every METRICS_SNAPSHOT_SECONDS
+
+    curl -s localhost:9108/metrics | python -m json.tool
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.log import get_logger
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))     # 0 = no endpoint
+METRICS_FILE = os.getenv("METRICS_FILE")               # unset = no snapshot file
+METRICS_SNAPSHOT_SECONDS = 10
+RATE_WINDOW_SECONDS = 10
+
+log = get_logger("metrics")
+
+
+# ============================
+# HDR-STYLE HISTOGRAM
+# ============================
+class Histogram:
+    """
+    Log-linear histogram of non-negative values.
+
+    Values are stored as integers of value * scale (scale=1e6 records
+    seconds with microsecond resolution). Buckets below 32 units are exact;
+    above that each power of two is split into 16 buckets.
+    """
+    SUB_BITS = 4
+    SUB = 1 << SUB_BITS                 # 16 sub-buckets per power of two
+    MAX_UNITS = (1 << 36) - 1           # ~19 h in microseconds
+
+    def __init__(self, scale=1e6):
+        self.scale = scale
+        self.counts = [0] * self._index(self.MAX_UNITS) + [0]
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _index(cls, units):
+        bits = units.bit_length()
+        if bits <= cls.SUB_BITS + 1:
+            return units
+        shift = bits - cls.SUB_BITS - 1
+        return shift * cls.SUB + (units >> shift)
+
+    @classmethod
+    def _upper(cls, index):
+        """Highest value (in units) that falls in bucket `index`."""
+        if index < 2 * cls.SUB:
+            return index
+        shift = index // cls.SUB - 1
+        return ((index - shift * cls.SUB + 1) << shift) - 1
+
+    def record(self, value):
+        units = min(self.MAX_UNITS, max(0, int(value * self.scale)))
+        i = self._index(units)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentiles(self, qs):
+        """Values at the given quantiles (0..1); bucket upper bounds, capped at max."""
+        with self._lock:
+            counts, count, vmax = list(self.counts), self.count, self.max
+        if not count:
+            return [None] * len(qs)
+
+        out, seen, i = [], 0, 0
+        for q in qs:
+            target = max(1, int(q * count + 0.5))
+            while seen < target:
+                seen += counts[i]
+                i += 1
+            out.append(min(vmax, self._upper(i - 1) / self.scale))
+        return out
+
+    def snapshot(self, unit=1.0, digits=3):
+        """count / mean / min / p50 / p90 / p99 / p999 / max, multiplied by `unit`."""
+        p50, p90, p99, p999 = self.percentiles((0.5, 0.9, 0.99, 0.999))
+
+        def r(v):
+            return None if v is None else round(v * unit, digits)
+
+        return {
+            "count": self.count,
+            "mean": r(self.total / self.count) if self.count else None,
+            "min": r(self.min),
+            "p50": r(p50),
+            "p90": r(p90),
+            "p99": r(p99),
+            "p999": r(p999),
+            "max": r(self.max),
+        }
+
+
+# ============================
+# RATE (per-second buckets)
+# ============================
+class RateMeter:
+    """Events per second over the last `window` whole seconds."""
+
+    def __init__(self, window=RATE_WINDOW_SECONDS):
+        self.window = window
+        self._buckets = deque(maxlen=window + 1)   # [second, count]
+        self._lock = threading.Lock()
+
+    def mark(self, n=1):
+        now = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == now:
+                self._buckets[-1][1] += n
+            else:
+                self._buckets.append([now, n])
+
+    def rate(self):
+        now = int(time.monotonic())
+        with self._lock:
+            # The current second is still filling up; leave it out
+            total = sum(c for s, c in self._buckets if now - self.window <= s < now)
+        return total / self.window
+
+
+# ============================
+# PER-CAMERA METRICS
+# ============================
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.stages = {}
+        self.values = {}
+        self.counters = Counter()
+        self.fps = RateMeter()
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, name, scale):
+        h = table.get(name)
+        if h is None:
+            with self._lock:
+                h = table.setdefault(name, Histogram(scale))
+        return h
+
+    def observe(self, stage, seconds):
+        """Record one duration (seconds) for `stage`."""
+        self._histogram(self.stages, stage, 1e6).record(seconds)
+
+    def observe_value(self, name, value, scale=10):
+        """Record a plain value; scale sets the resolution (10 = 0.1)."""
+        self._histogram(self.values, name, scale).record(value)
+
+    def incr(self, name, n=1):
+        self.counters[name] += n
+
+    def frame(self):
+        self.counters["frames"] += 1
+        self.fps.mark()
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def snapshot(self):
+        counters = dict(self.counters)
+        uptime = time.time() - self.started
+        predictions = counters.get("predictions", 0)
+        return {
+            "uptime_s": round(uptime, 1),
+            "fps": round(self.fps.rate(), 2),
+            "fps_avg": round(counters.get("frames", 0) / uptime, 2) if uptime > 0 else 0.0,
+            "unknown_rate": round(counters.get("unknown", 0) / predictions, 3) if predictions else None,
+            "counters": counters,
+            "stages_ms": {k: h.snapshot(unit=1000) for k, h in sorted(self.stages.items())},
+            "values": {k: h.snapshot() for k, h in sorted(self.values.items())},
+        }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_metrics(name):
+    """Process-wide StageMetrics for a camera id (created on first use)."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = StageMetrics(name)
+        return _registry[name]
+
+
+def snapshot_all():
+    with _registry_lock:
+        registry = dict(_registry)
+    return {
+        "ts": round(time.time(), 3),
+        "pid": os.getpid(),
+        "cameras": {name: m.snapshot() for name, m in sorted(registry.items())},
+    }
+
+
+# ============================
+# EXPORT
+# ============================
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = json.dumps(snapshot_all()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # polled every few seconds; keep stdout quiet
+
+
+def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    """Serve GET /metrics on a daemon thread; local interface only."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_snapshot(path=METRICS_FILE):
+    """Atomically replace `path` with the current snapshot."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot_all(), f, indent=1)
+    os.replace(tmp, path)
+
+
+def start_snapshot_writer(path=METRICS_FILE, interval=METRICS_SNAPSHOT_SECONDS):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(path)
+            except OSError as e:
+                log.warning("snapshot_failed", path=path, error=e, key="snapshot_failed", every=300)
+
+    threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+
+
+_export_lock = threading.Lock()
+_exporting = False
+
+
+def start_metrics_export():
+    """Start the endpoint and/or snapshot file if configured; once per process."""
+    global _exporting
+    with _export_lock:
+        if _exporting:
+            return
+        _exporting = True
+        if METRICS_PORT:
+            start_metrics_server(METRICS_PORT)
+            log.info("endpoint", url=f"http://127.0.0.1:{METRICS_PORT}/metrics")
+        if METRICS_FILE:
+            start_snapshot_writer(METRICS_FILE)
+            log.info("snapshot_file", path=METRICS_FILE, every_s=METRICS_SNAPSHOT_SECONDS)
+
+
+__all__ = [
+    "Histogram",
+    "RateMeter",
+    "StageMetrics",
+    "get_metrics",
+    "snapshot_all",
+    "start_metrics_export",
+]
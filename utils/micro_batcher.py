@@ -0,0 +1,88 @@
+"""
+utils/micro_batcher.py
+----------------------
+Server-side micro-batching for the recognition API.
+
+Request threads submit() one item and block on its result. A single
+worker thread waits for the first item, keeps collecting for up to
+`max_wait` seconds (or until `max_batch` items are queued), runs the
+whole batch through process_batch(items) -> results, and hands each
+result back to the thread that submitted it.
+
+At low load a request pays at most `max_wait` extra latency; under load
+many frames share one DNN forward pass.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch=16, max_wait=0.005, name="micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item, timeout=None):
+        """Queue one item and wait for its result; re-raises the batch's error."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            self.requests += len(batch)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
@@ -0,0 +1,72 @@
+"""
+utils/motion_gate.py
+--------------------
+Cheap motion gate placed in front of the DNN face detector.
+
+Each frame is shrunk to a thumbnail, converted to grayscale and compared
+with the previous thumbnail. The detector only runs when enough pixels
+changed, or when `force_interval` seconds passed since the last detection
+so a person standing perfectly still is still picked up.
+"""
+
+import time
+import cv2
+
+
+class MotionGate:
+    def __init__(self, thumb_width=160, pixel_threshold=25, min_changed_ratio=0.005,
+                 force_interval=2.0):
+        self.thumb_width = thumb_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.force_interval = force_interval
+
+        self._prev = None
+        self._last_detect = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.forced = 0
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.thumb_width, max(1, int(h * self.thumb_width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def should_detect(self, frame, now=None):
+        """True if the detector should run on this frame.
+        `now` (seconds) overrides the clock, e.g. frame timestamps of a recording."""
+        self.frames += 1
+        now = time.monotonic() if now is None else now
+        thumb = self._thumbnail(frame)
+        prev, self._prev = self._prev, thumb
+
+        if prev is None or prev.shape != thumb.shape:
+            moved = True
+        else:
+            diff = cv2.absdiff(thumb, prev)
+            changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255,
+                                                     cv2.THRESH_BINARY)[1])
+            moved = changed >= self.min_changed_ratio * thumb.size
+
+        if moved:
+            self._last_detect = now
+            return True
+
+        if now - self._last_detect >= self.force_interval:
+            self._last_detect = now
+            self.forced += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "forced": self.forced,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
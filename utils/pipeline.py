@@ -0,0 +1,322 @@
+"""
+utils/pipeline.py
+-----------------
+Staged recognition pipeline used by the live attendance loop.
+
+    grabber thread  →  frame queue  →  detect/recognize thread
+                                          ├──→ event queue  →  attendance writer thread
+                                          └──→ result queue →  caller (display)
+
+The frame and result queues are bounded and drop their oldest item when
+full, so a slow stage never backs up into the camera buffer. Attendance
+events are never dropped: the event queue makes recognition wait for room,
+and a failed journal write is retried until it succeeds.
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+from utils.log import get_logger
+
+log = get_logger("pipeline")
+
+# A failed write is retried with capped exponential backoff until it succeeds
+WRITE_RETRY_SECONDS = 0.5
+WRITE_RETRY_MAX_SECONDS = 8.0
+
+
+# ============================
+# BOUNDED DROP-OLDEST QUEUE
+# ============================
+class DropOldestQueue:
+    """Bounded FIFO that evicts the oldest item instead of blocking the producer."""
+
+    def __init__(self, maxsize, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        old = self._queue.get_nowait()
+                        self.dropped += 1
+                        if self.on_drop is not None:
+                            self.on_drop(old)
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        """Return the next item, or None if nothing arrived within `timeout`."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {"depth": self.qsize(), "max": self.maxsize, "dropped": self.dropped}
+
+
+# ============================
+# BOUNDED BLOCKING QUEUE
+# ============================
+class BlockingQueue:
+    """Bounded FIFO that makes the producer wait for room; nothing is dropped."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.waits = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.waits += 1
+            self._queue.put(item)
+
+    def get(self, timeout=None):
+        """Return the next item, or None if nothing arrived within `timeout`."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {"depth": self.qsize(), "max": self.maxsize, "waits": self.waits}
+
+
+# ============================
+# REUSABLE FRAME BUFFERS
+# ============================
+class FrameBufferPool:
+    """
+    Free-list of frame arrays for cap.read(dst).
+
+    A buffer goes back to the pool when the pipeline is done with it
+    (dropped from a queue or released by the display loop), so in steady
+    state the grabber reuses the same few arrays instead of allocating.
+    """
+
+    def __init__(self, max_free=8):
+        self.max_free = max_free
+        self.allocated = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        with self._lock:
+            while self._free:
+                buf = self._free.pop()
+                if buf.shape == shape:
+                    return buf
+        self.allocated += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buf):
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buf)
+
+    def stats(self):
+        return {"allocated": self.allocated, "free": len(self._free)}
+
+
+# ============================
+# RECOGNITION PIPELINE
+# ============================
+class RecognitionPipeline:
+    """
+    Runs capture, recognition and attendance writing on separate threads.
+
+    process(frame) -> (results, events)
+        results: (x, y, w, h, user_id, name, distance) per face, user_id/name
+                 None for unknown faces
+        events:  (user_id, name, distance) to hand to the attendance writer
+    write(user_id, name, distance) journals one event.
+        A write that raises is logged and retried with capped backoff until
+        it succeeds; events behind it wait in the event queue, and once that
+        is full the recognition stage waits too.
+
+    An optional AdaptiveRateController paces the recognition stage and is
+    fed the capture → result latency of every processed frame.
+
+    An optional StageMetrics (utils/metrics.py) receives capture, process,
+    write and end-to-end latency timings plus the frame rate.
+
+    With reuse_frames=True frames are read into pooled buffers; the caller
+    must then hand each result back with release_result() once displayed.
+    """
+
+    def __init__(self, cap, process, write, frame_queue_size=1,
+                 event_queue_size=64, result_queue_size=1, controller=None,
+                 reuse_frames=False, metrics=None):
+        self.cap = cap
+        self.process = process
+        self.write = write
+        self.controller = controller
+        self.metrics = metrics
+        self.pool = FrameBufferPool() if reuse_frames else None
+
+        self.frames = DropOldestQueue(frame_queue_size, on_drop=self._release_item)
+        self.events = BlockingQueue(event_queue_size)
+        self.results = DropOldestQueue(result_queue_size, on_drop=self._release_item)
+
+        self.counters = {"captured": 0, "processed": 0, "written": 0, "write_errors": 0}
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ---------------------------
+    # STAGES
+    # ---------------------------
+    def _grab_loop(self):
+        frame_id = 0
+        shape = None
+        while not self._stop.is_set():
+            buf = self.pool.acquire(shape) if (self.pool and shape) else None
+            started = time.perf_counter()
+            ret, frame = self.cap.read(buf) if buf is not None else self.cap.read()
+            if self.metrics is not None:
+                self.metrics.observe("capture", time.perf_counter() - started)
+            if not ret:
+                log.warning("camera_read_failed")
+                self._stop.set()
+                break
+            if self.pool is not None:
+                # Decoder allocated its own array (first frame / size change)
+                if buf is not None and frame is not buf:
+                    self.pool.release(buf)
+                shape = frame.shape
+            frame_id += 1
+            self.counters["captured"] += 1
+            self.frames.put((frame_id, time.monotonic(), frame))
+
+    def _recognize_loop(self):
+        while not self._stop.is_set():
+            if self.controller is not None:
+                # Sleep off the pacing interval, then take the newest frame
+                if self._stop.wait(self.controller.delay()):
+                    break
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, captured_at, frame = item
+            if self.controller is not None:
+                self.controller.begin_frame()
+
+            try:
+                started = time.perf_counter()
+                results, events = self.process(frame)
+                if self.metrics is not None:
+                    self.metrics.observe("process", time.perf_counter() - started)
+            except Exception as e:
+                log.error("recognition_error", error=e, key=("recognition_error", type(e).__name__),
+                          every=10)
+                self._release_item(item)
+                continue
+
+            for event in events:
+                self.events.put(event)
+
+            self.counters["processed"] += 1
+            latency = time.monotonic() - captured_at
+            if self.controller is not None:
+                self.controller.observe(latency)
+            if self.metrics is not None:
+                self.metrics.observe("latency", latency)
+                self.metrics.frame()
+            self.results.put((frame_id, captured_at, frame, results))
+
+    def _write_loop(self):
+        # Drain remaining events after stop so nothing already queued is lost
+        while not self._stop.is_set() or self.events.qsize():
+            item = self.events.get(timeout=0.1)
+            if item is None:
+                continue
+            self._write_event(*item)
+
+    def _write_event(self, uid, name, distance):
+        delay = WRITE_RETRY_SECONDS
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                started = time.perf_counter()
+                self.write(uid, name, distance)
+                if self.metrics is not None:
+                    self.metrics.observe("write", time.perf_counter() - started)
+                self.counters["written"] += 1
+                return
+            except Exception as e:
+                self.counters["write_errors"] += 1
+                log.error("write_error", user=name, attempt=attempt, error=e,
+                          key=("write_error", type(e).__name__), every=10)
+            # Not _stop.wait(): events still queued at stop() must be retried too
+            time.sleep(delay)
+            delay = min(delay * 2, WRITE_RETRY_MAX_SECONDS)
+
+    # ---------------------------
+    # CONTROL
+    # ---------------------------
+    def start(self):
+        for target, name in ((self._grab_loop, "grabber"),
+                             (self._recognize_loop, "recognizer"),
+                             (self._write_loop, "writer")):
+            t = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+            if t.is_alive() and t.name == "pipeline-writer":
+                # Daemon thread: keeps retrying until the journal accepts the events
+                log.warning("writer_still_draining", pending=self.events.qsize())
+
+    def is_running(self):
+        return not self._stop.is_set()
+
+    def next_result(self, timeout=None):
+        """(frame_id, captured_at, frame, results) of the newest processed frame, or None."""
+        return self.results.get(timeout=timeout)
+
+    def release_result(self, item):
+        """Return a displayed result's frame buffer to the pool (no-op without reuse_frames)."""
+        self._release_item(item)
+
+    def _release_item(self, item):
+        if self.pool is not None:
+            self.pool.release(item[2])
+
+    def stats(self):
+        stats = {
+            "queues": {
+                "frames": self.frames.stats(),
+                "events": self.events.stats(),
+                "results": self.results.stats(),
+            },
+            **self.counters,
+        }
+        if self.controller is not None:
+            stats["rate_controller"] = self.controller.stats()
+        if self.pool is not None:
+            stats["frame_pool"] = self.pool.stats()
+        return stats
@@ -0,0 +1,119 @@
+"""
+utils/rate_controller.py
+------------------------
+Adaptive frame-rate controller for the recognition loop.
+
+It measures end-to-end latency (capture → results ready) and CPU use, and
+once per `adjust_period` moves three knobs to stay inside the budget:
+
+    latency too high → shrink the detector input, then detect less often
+    CPU too high     → process fewer frames per second
+    both well under  → undo the above, one step at a time
+"""
+
+import os
+import time
+
+SCALE_STEP = 0.1
+
+
+class AdaptiveRateController:
+    def __init__(self, latency_target=0.25, cpu_target=0.85, max_fps=15.0, min_fps=1.0,
+                 max_detect_interval=4, min_scale=0.5, adjust_period=1.0, smoothing=0.2):
+        self.latency_target = latency_target
+        self.cpu_target = cpu_target
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.max_detect_interval = max_detect_interval
+        self.min_scale = min_scale
+        self.adjust_period = adjust_period
+        self.smoothing = smoothing
+
+        # Current settings
+        self.fps = max_fps
+        self.detect_interval = 1
+        self.scale = 1.0
+
+        # Measurements
+        self.latency = 0.0
+        self.cpu = 0.0
+        self.frames = 0
+
+        now = time.monotonic()
+        self._next_slot = now
+        self._last_adjust = now
+        self._last_wall = now
+        self._last_cpu = time.process_time()
+
+    # ---------------------------
+    # PACING
+    # ---------------------------
+    def delay(self):
+        """Seconds to wait before taking the next frame."""
+        return max(0.0, self._next_slot - time.monotonic())
+
+    def begin_frame(self):
+        now = time.monotonic()
+        self._next_slot = max(now, self._next_slot) + 1.0 / self.fps
+        self.frames += 1
+
+    def should_detect(self):
+        return self.frames % self.detect_interval == 0
+
+    def detection_gap(self):
+        """Seconds between detections at the current fps and detection interval."""
+        return self.detect_interval / self.fps
+
+    # ---------------------------
+    # FEEDBACK
+    # ---------------------------
+    def observe(self, latency):
+        """Feed the end-to-end latency (seconds) of a processed frame."""
+        self.latency += self.smoothing * (latency - self.latency)
+
+        now = time.monotonic()
+        if now - self._last_adjust >= self.adjust_period:
+            self._measure_cpu(now)
+            self._adjust()
+            self._last_adjust = now
+
+    def _measure_cpu(self, now):
+        cpu_now = time.process_time()
+        wall = now - self._last_wall
+        cpus = os.cpu_count() or 1
+        usage = (cpu_now - self._last_cpu) / (wall * cpus) if wall > 0 else 0.0
+
+        # Other processes on the box count against our headroom too
+        if hasattr(os, "getloadavg"):
+            usage = max(usage, os.getloadavg()[0] / cpus)
+
+        self.cpu = usage
+        self._last_wall, self._last_cpu = now, cpu_now
+
+    def _adjust(self):
+        if self.latency > self.latency_target:
+            if self.scale > self.min_scale:
+                self.scale = round(max(self.min_scale, self.scale - SCALE_STEP), 2)
+            elif self.detect_interval < self.max_detect_interval:
+                self.detect_interval += 1
+        elif self.latency < 0.5 * self.latency_target:
+            if self.detect_interval > 1:
+                self.detect_interval -= 1
+            elif self.scale < 1.0:
+                self.scale = round(min(1.0, self.scale + SCALE_STEP), 2)
+
+        if self.cpu > self.cpu_target:
+            self.fps = max(self.min_fps, self.fps * 0.8)
+        elif self.cpu < 0.7 * self.cpu_target:
+            self.fps = min(self.max_fps, self.fps * 1.25)
+
+    def stats(self):
+        return {
+            "fps": round(self.fps, 1),
+            "detect_interval": self.detect_interval,
+            "detection_gap_s": round(self.detection_gap(), 2),
+            "scale": self.scale,
+            "latency_ms": round(self.latency * 1000, 1),
+            "latency_target_ms": round(self.latency_target * 1000, 1),
+            "cpu": round(self.cpu, 2),
+        }
@@ -0,0 +1,218 @@
+"""
+utils/recognition_service.py
+----------------------------
+Headless multi-camera recognition service.
+
+One long-lived process per host runs a RecognitionPipeline per camera
+listed in cameras.json (see utils/camera_config.py). A supervisor checks
+the pipelines every few seconds and reopens any camera whose source
+failed or stalled (no frame captured for CAMERA_STALL_SECONDS), backing
+off exponentially between attempts. Video files and image directories
+that simply ran out are not restarted.
+
+    python -m utils.recognition_service [--config cameras.json] [--cameras gate-1,gate-2]
+"""
+
+import argparse
+import os
+import signal
+import threading
+import time
+
+from utils.camera_config import CAMERA_CONFIG_FILE, load_camera_configs
+from utils.detectors import create_detector
+from utils.frame_sources import open_frame_source
+from utils.mark_attendance import (ATTENDANCE_CACHE, CONFIDENCE_THRESHOLD, create_camera_pipeline,
+                                   load_recognizer, start_attendance_journal, stop_attendance_journal)
+
+SUPERVISE_INTERVAL_SECONDS = 2.0
+STATS_INTERVAL_SECONDS = 30
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 60.0
+STABLE_AFTER_SECONDS = 60.0
+# A running pipeline whose capture count stays flat this long (e.g. a
+# hung RTSP read) is torn down and restarted; 0 disables the check
+CAMERA_STALL_SECONDS = float(os.getenv("CAMERA_STALL_SECONDS", "30"))
+
+
+# ============================
+# ONE CAMERA
+# ============================
+class CameraWorker:
+    """Owns the source, recognizer, detector and pipeline for one camera."""
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.cap = None
+        self.pipeline = None
+        self.processor = None
+        self.finished = False
+
+        self.restarts = 0
+        self.stalls = 0
+        self.started_at = None
+        self.last_captured = 0
+        self.last_progress = None
+        self.next_attempt = 0.0
+        self.backoff = RESTART_BACKOFF_MIN
+
+    def start(self):
+        cam = self.camera
+        cap = open_frame_source(cam.source, cam.fps, cam.loop)
+        if not cap.isOpened():
+            cap.release()
+            raise RuntimeError(f"cannot open source {cam.source!r}")
+
+        recognizer, directory = load_recognizer()
+        if recognizer is None:
+            cap.release()
+            raise RuntimeError("no LBPH model")
+
+        try:
+            # dnn nets are not thread-safe, so every camera gets its own detector
+            detector = create_detector(conf_threshold=CONFIDENCE_THRESHOLD)
+            self.pipeline, self.processor = create_camera_pipeline(cam, cap, recognizer, directory,
+                                                                   detector)
+        except Exception:
+            directory.stop()
+            cap.release()
+            raise
+        self.cap = cap
+        self.pipeline.start()
+        self.started_at = self.last_progress = time.monotonic()
+        self.last_captured = 0
+        print(f"[SERVICE] {cam.camera_id}: started ({cam.source})")
+
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        if self.processor is not None:
+            # Each start() loads a new directory with its own refresh thread
+            self.processor.close()
+            self.processor = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def is_running(self):
+        return self.pipeline is not None and self.pipeline.is_running()
+
+    def _retry_later(self, now):
+        self.next_attempt = now + self.backoff
+        self.backoff = min(RESTART_BACKOFF_MAX, self.backoff * 2)
+
+    def _stalled(self, now):
+        captured = self.pipeline.counters["captured"]
+        if captured != self.last_captured:
+            self.last_captured, self.last_progress = captured, now
+            return False
+        return CAMERA_STALL_SECONDS > 0 and now - self.last_progress >= CAMERA_STALL_SECONDS
+
+    def supervise(self, now):
+        """Restart a failed or stalled camera once its backoff has elapsed."""
+        if self.finished:
+            return
+
+        if self.is_running():
+            if not self._stalled(now):
+                if now - self.started_at >= STABLE_AFTER_SECONDS:
+                    self.backoff = RESTART_BACKOFF_MIN
+                return
+            # A read blocked in the driver can't be interrupted; stop() gives up
+            # on joining it after its timeout and the daemon thread is abandoned
+            self.stalls += 1
+            self.stop()
+            print(f"[SERVICE] {self.camera.camera_id}: no frames for {now - self.last_progress:.0f}s, "
+                  f"restarting in {self.backoff:.0f}s")
+            self._retry_later(now)
+            return
+
+        if self.pipeline is not None:
+            exhausted = getattr(self.cap, "exhausted", False)
+            self.stop()
+            if exhausted:
+                self.finished = True
+                print(f"[SERVICE] {self.camera.camera_id}: source finished")
+                return
+            print(f"[SERVICE] {self.camera.camera_id}: pipeline stopped, restarting in {self.backoff:.0f}s")
+            self._retry_later(now)
+            return
+
+        if now < self.next_attempt:
+            return
+
+        try:
+            if self.started_at is not None:
+                self.restarts += 1
+            self.start()
+        except Exception as e:
+            print(f"[SERVICE] {self.camera.camera_id}: start failed: {e}")
+            self._retry_later(now)
+
+    def stats(self):
+        stats = {"running": self.is_running(), "restarts": self.restarts, "stalls": self.stalls,
+                 "finished": self.finished}
+        if self.pipeline is not None:
+            stats.update(self.pipeline.stats())
+            stats.update(self.processor.stats())
+        return stats
+
+
+# ============================
+# SERVICE / SUPERVISOR
+# ============================
+class RecognitionService:
+    def __init__(self, cameras):
+        self.workers = [CameraWorker(c) for c in cameras]
+        self._stop = threading.Event()
+
+    def run(self):
+        print(f"[SERVICE] Starting {len(self.workers)} camera(s)")
+        replayer = start_attendance_journal()
+        last_report = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                for worker in self.workers:
+                    worker.supervise(now)
+
+                if all(w.finished for w in self.workers):
+                    print("[SERVICE] All sources finished.")
+                    break
+
+                if now - last_report >= STATS_INTERVAL_SECONDS:
+                    for worker in self.workers:
+                        print(f"[STATS] {worker.camera.camera_id}", worker.stats())
+                    print("[STATS] journal", replayer.stats())
+                    print("[STATS] attendance cache", ATTENDANCE_CACHE.stats())
+                    last_report = now
+
+                self._stop.wait(SUPERVISE_INTERVAL_SECONDS)
+        finally:
+            for worker in self.workers:
+                worker.stop()
+            stop_attendance_journal()
+            print("[SERVICE] Stopped.")
+
+    def stop(self, *_):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-camera attendance recognition")
+    parser.add_argument("--config", default=CAMERA_CONFIG_FILE, help="cameras.json path")
+    parser.add_argument("--cameras", help="comma-separated camera ids (default: all)")
+    args = parser.parse_args()
+
+    cameras = load_camera_configs(args.config)
+    if args.cameras:
+        wanted = set(args.cameras.split(","))
+        cameras = [c for c in cameras if c.camera_id in wanted]
+    if not cameras:
+        raise SystemExit(f"[ERROR] No cameras configured in {args.config}")
+
+    service = RecognitionService(cameras)
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
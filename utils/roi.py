@@ -0,0 +1,57 @@
+"""
+utils/roi.py
+------------
+Region-of-interest cropping for face detection.
+
+The detector only sees the bounding rectangle of the camera's ROI
+polygon; boxes are shifted back to full-frame coordinates and dropped if
+their centre falls outside the polygon.
+"""
+
+import cv2
+import numpy as np
+
+
+class RegionOfInterest:
+    def __init__(self, polygon=None):
+        """polygon: normalized [(x, y), ...] points, or None for the full frame."""
+        self.polygon = polygon
+        self._shape = None
+        self._points = None
+        self._rect = None
+
+    def _fit(self, shape):
+        """Convert the normalized polygon to pixels for this frame size (cached)."""
+        if shape == self._shape:
+            return
+        h, w = shape[:2]
+        self._shape = shape
+        if not self.polygon:
+            self._points = None
+            self._rect = (0, 0, w, h)
+            return
+
+        pts = np.array([(px * w, py * h) for px, py in self.polygon], dtype=np.float32)
+        pts[:, 0] = np.clip(pts[:, 0], 0, w - 1)
+        pts[:, 1] = np.clip(pts[:, 1], 0, h - 1)
+        self._points = pts
+        self._rect = cv2.boundingRect(pts.astype(np.int32))
+
+    def crop(self, frame):
+        """(view of the ROI's bounding rectangle, (offset_x, offset_y))."""
+        self._fit(frame.shape)
+        x, y, w, h = self._rect
+        return frame[y:y + h, x:x + w], (x, y)
+
+    def map_boxes(self, boxes, offset):
+        """Shift crop-relative boxes to full-frame coordinates, keep those inside the polygon."""
+        ox, oy = offset
+        mapped = []
+        for (x, y, w, h, conf) in boxes:
+            x, y = x + ox, y + oy
+            if self._points is not None:
+                centre = (float(x + w / 2), float(y + h / 2))
+                if cv2.pointPolygonTest(self._points, centre, False) < 0:
+                    continue
+            mapped.append((x, y, w, h, conf))
+        return mapped
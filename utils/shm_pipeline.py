@@ -0,0 +1,367 @@
+"""
+utils/shm_pipeline.py
+---------------------
+Multi-process recognition for hosts with many cores.
+
+    capture process ──► SharedFrameRing (multiprocessing.shared_memory)
+                              │   only (seq, timestamp) goes through the work queue
+                              ▼
+                     N detection/LBPH worker processes
+                              │   small result tuples
+                              ▼
+                     attendance writer (parent process)
+
+Frames are decoded straight into a ring slot and read in place by the
+workers, so pixel data is never pickled or copied between processes.
+Each slot carries a sequence number; a worker re-checks it after
+processing and discards the result if the capture process has already
+overwritten that slot.
+
+Run from the repo root:
+    python -m utils.shm_pipeline --workers 8
+"""
+
+import argparse
+import os
+import queue
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from utils.frame_sources import open_frame_source
+from utils.log import get_logger
+
+WORK_QUEUE_SIZE = 32
+STATS_INTERVAL_SECONDS = 10
+
+# Results come back from the workers out of order; hold each one at most
+# this long for earlier frames (dropped frames never arrive)
+REORDER_WAIT_SECONDS = 0.2
+
+log = get_logger("shm")
+
+
+# ============================
+# SHARED FRAME RING BUFFER
+# ============================
+class SharedFrameRing:
+    """
+    Fixed-size ring of uint8 frames in one shared memory block.
+
+    Layout: int64 sequence number per slot, followed by the frames.
+    A slot's sequence is -1 while it is being written.
+    """
+
+    def __init__(self, shape, slots, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        header_bytes = 8 * slots
+        size = header_bytes + int(np.prod(self.shape)) * slots
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach_shared_memory(name)
+
+        self.seqs = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots, *self.shape), dtype=np.uint8,
+                                 buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.seqs[:] = -1
+
+    def spec(self):
+        """Picklable description used to attach from another process."""
+        return {"name": self.shm.name, "shape": self.shape, "slots": self.slots}
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec["shape"], spec["slots"], name=spec["name"])
+
+    def begin_write(self, seq):
+        slot = seq % self.slots
+        self.seqs[slot] = -1
+        return self.frames[slot]
+
+    def commit(self, seq):
+        self.seqs[seq % self.slots] = seq
+
+    def read(self, seq):
+        """View of frame `seq`, or None if the slot no longer holds it."""
+        slot = seq % self.slots
+        if self.seqs[slot] != seq:
+            return None
+        return self.frames[slot]
+
+    def is_current(self, seq):
+        return self.seqs[seq % self.slots] == seq
+
+    def close(self):
+        # numpy views must be released before the mapping can be closed
+        del self.seqs, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Older Pythons register attached blocks too and unlink them on exit
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# ============================
+# CAPTURE PROCESS
+# ============================
+def _probe_frame_shape(source):
+    cap = open_frame_source(source)
+    try:
+        ret, frame = cap.read() if cap.isOpened() else (False, None)
+        return frame.shape if ret else None
+    finally:
+        cap.release()
+
+
+def _capture_process(source, ring_spec, work_queue, stop, captured, dropped):
+    ring = SharedFrameRing.attach(ring_spec)
+    cap = open_frame_source(source)
+    h, w = ring.shape[:2]
+    seq = 0
+    slot = frame = None
+
+    try:
+        while not stop.is_set():
+            seq += 1
+            slot = ring.begin_write(seq)
+            ret, frame = cap.read(slot)
+            if not ret:
+                log.error("camera_read_failed", source=str(source))
+                break
+            # Decoder ignored our buffer (size changed) → fit it into the slot
+            if frame.ctypes.data != slot.ctypes.data:
+                cv2.resize(frame, (w, h), dst=slot)
+            ring.commit(seq)
+
+            with captured.get_lock():
+                captured.value += 1
+
+            item = (seq, time.time())
+            try:
+                work_queue.put_nowait(item)
+            except queue.Full:
+                # Workers are behind: drop the oldest pending frame. Workers race
+                # us for the queue, so either step can fail; then this frame goes too.
+                lost = 1
+                try:
+                    work_queue.get_nowait()
+                    work_queue.put_nowait(item)
+                except queue.Empty:
+                    pass
+                except queue.Full:
+                    lost = 2
+                with dropped.get_lock():
+                    dropped.value += lost
+    finally:
+        cap.release()
+        slot = frame = None
+        ring.close()
+        stop.set()
+
+
+# ============================
+# DETECTION / RECOGNITION WORKERS
+# ============================
+def _worker_process(worker_id, ring_spec, work_queue, result_queue, stop, cv_threads):
+    from utils.mark_attendance import load_recognizer, recognize_faces
+
+    cv2.setNumThreads(cv_threads)
+    ring = SharedFrameRing.attach(ring_spec)
+    # Workers only map labels to users; the parent keeps user status fresh
+    recognizer, directory = load_recognizer(sync_users=False)
+    if recognizer is None:
+        ring.close()
+        stop.set()
+        return
+
+    frame = None
+    try:
+        while not stop.is_set():
+            try:
+                seq, captured_at = work_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            frame = ring.read(seq)
+            if frame is None:
+                result_queue.put((worker_id, seq, captured_at, None))
+                continue
+
+            results = recognize_faces(frame, recognizer, directory)
+
+            # Slot overwritten while we were reading it → result is unreliable
+            if not ring.is_current(seq):
+                results = None
+            result_queue.put((worker_id, seq, captured_at, results))
+    finally:
+        frame = None
+        ring.close()
+
+
+# ============================
+# PARENT: ATTENDANCE WRITER
+# ============================
+class ReorderBuffer:
+    """
+    Puts worker results back in capture order before tracking.
+
+    A result is held until every earlier sequence number has been released,
+    or until it waited `max_wait` seconds or `max_pending` results are held
+    (frames dropped by the capture process never arrive). A result older
+    than one already released is late and refused by push().
+    """
+
+    def __init__(self, max_pending, max_wait=REORDER_WAIT_SECONDS):
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self._pending = {}          # seq -> (arrived, item)
+        self._released = 0          # highest sequence number handed out
+
+    def push(self, seq, item, now=None):
+        """False if a later result was already released."""
+        if seq <= self._released:
+            return False
+        self._pending[seq] = (time.monotonic() if now is None else now, item)
+        return True
+
+    def pop_ready(self, now=None):
+        """(seq, item) pairs that can be released, in sequence order."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        while self._pending:
+            seq = min(self._pending)
+            arrived, item = self._pending[seq]
+            if (seq != self._released + 1 and len(self._pending) <= self.max_pending
+                    and now - arrived < self.max_wait):
+                break
+            del self._pending[seq]
+            self._released = seq
+            ready.append((seq, item))
+        return ready
+
+
+def run_multiprocess(source=0, num_workers=None, cv_threads=1, slots=None):
+    """Capture in one process, recognize in `num_workers` processes, write here."""
+    from utils.mark_attendance import (close_attendance_writer, get_attendance_writer,
+                                       load_user_directory, new_tracker, queue_attendance_event)
+
+    num_workers = num_workers or max(1, (os.cpu_count() or 2) - 2)
+    shape = _probe_frame_shape(source)
+    if shape is None:
+        log.error("camera_open_failed", source=str(source))
+        return
+
+    # Enough slots that a frame is rarely overwritten while a worker holds it
+    ring = SharedFrameRing(shape, slots or 2 * num_workers + WORK_QUEUE_SIZE)
+
+    ctx = mp.get_context("spawn")
+    stop = ctx.Event()
+    captured = ctx.Value("q", 0)
+    dropped = ctx.Value("q", 0)
+    work_queue = ctx.Queue(maxsize=WORK_QUEUE_SIZE)
+    result_queue = ctx.Queue()
+
+    procs = [ctx.Process(target=_capture_process, name="shm-capture",
+                         args=(source, ring.spec(), work_queue, stop, captured, dropped),
+                         daemon=True)]
+    for i in range(num_workers):
+        procs.append(ctx.Process(target=_worker_process, name=f"shm-worker-{i}",
+                                 args=(i, ring.spec(), work_queue, result_queue, stop, cv_threads),
+                                 daemon=True))
+    for p in procs:
+        p.start()
+
+    log.info("started", workers=num_workers, source=str(source))
+
+    # Workers predict every face; tracking/voting happens here so each
+    # visit is still written once. Results are put back in capture order
+    # first, so the tracker never sees time go backwards.
+    tracker = new_tracker()
+    directory = load_user_directory()
+    reorder = ReorderBuffer(max_pending=2 * num_workers)
+
+    stats = {"processed": 0, "stale": 0, "late": 0, "written": 0, "per_worker": [0] * num_workers}
+    last_report = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                worker_id, seq, captured_at, results = result_queue.get(timeout=REORDER_WAIT_SECONDS)
+                # Stale (None) results are pushed too, so later frames need not wait for them
+                if not reorder.push(seq, (worker_id, captured_at, results)):
+                    stats["late"] += 1
+            except queue.Empty:
+                pass
+
+            for seq, (worker_id, captured_at, results) in reorder.pop_ready():
+                if results is None:
+                    stats["stale"] += 1
+                    continue
+
+                stats["processed"] += 1
+                stats["per_worker"][worker_id] += 1
+
+                tracks = tracker.update([r[:4] for r in results], now=captured_at)
+                for (_, _, _, _, uid, name, confv), track in zip(results, tracks):
+                    if track.needs_prediction():
+                        track.vote((uid, name) if uid else None, confv)
+                    if track.identity and not track.marked:
+                        track.marked = True
+                        entry = directory.user(track.identity[0])
+                        if entry and not entry.active:
+                            log.info("inactive", user=entry.name, key=("inactive", entry.user_id),
+                                     every=60)
+                            continue
+                        queue_attendance_event(*track.identity, camera_id=str(source),
+                                               distance=track.distance,
+                                               institute_id=entry.institute_id if entry else None)
+                        stats["written"] += 1
+
+            if time.monotonic() - last_report >= STATS_INTERVAL_SECONDS:
+                log.info("stats", captured=captured.value, dropped=dropped.value,
+                         work_queue=_qsize(work_queue), tracker=tracker.stats(), **stats,
+                         writer=get_attendance_writer().stats(), log=log.stats())
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for p in procs:
+            p.join(5)
+        ring.close()
+        directory.stop()
+        close_attendance_writer()
+
+
+def _qsize(q):
+    try:
+        return q.qsize()
+    except NotImplementedError:  # macOS
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process LBPH attendance")
+    parser.add_argument("--source", default="0", help="camera index, device, URL, video file or image directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cv-threads", type=int, default=1, help="OpenCV threads per worker")
+    args = parser.parse_args()
+
+    src = int(args.source) if args.source.isdigit() else args.source
+    run_multiprocess(src, args.workers, args.cv_threads)
@@ -0,0 +1,198 @@
+"""
+utils/sightings.py
+------------------
+Raw recognition sightings in a MongoDB time-series collection.
+
+attendances only keeps the derived check-in/check-out entries. Every
+confirmed recognition is also stored here as
+
+    {ts, meta: {user_id, camera_id, source}, distance, confidence}
+
+distance is the recognizer's match distance (camera, upload); confidence
+is the score an edge node reports, on its own scale (null otherwise).
+
+so recognitions can be audited and attendance recomputed when the rules
+change. Documents expire after SIGHTING_TTL_DAYS.
+
+Attendance writers use record_sightings_safely(): a sightings outage must
+not hold back attendance (or journal acks), so failed inserts are kept
+in a bounded in-memory backlog and sent with the next batch instead.
+
+Rebuild attendances for a date range (IST dates, inclusive):
+
+    python -m utils.sightings --from 2026-10-01 --to 2026-10-07
+"""
+
+import argparse
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from utils.attendance_rules import IST, MARKED_BY, apply_attendance_event
+from utils.log import get_logger
+
+SIGHTINGS_COLLECTION = "sightings"
+SIGHTING_TTL_DAYS = int(os.getenv("SIGHTING_TTL_DAYS", 180))
+SIGHTING_BACKLOG_MAX = int(os.getenv("SIGHTING_BACKLOG_MAX", 10000))
+RECOMPUTE_WRITE_BATCH = 1000
+
+log = get_logger("sightings")
+
+_ensured = set()
+_ensure_lock = threading.Lock()
+
+# Sightings that could not be written yet (oldest dropped when full)
+_backlog = deque(maxlen=SIGHTING_BACKLOG_MAX)
+_backlog_lock = threading.Lock()
+_backlog_dropped = 0
+
+
+# ============================
+# WRITE
+# ============================
+def ensure_sightings_collection(db):
+    """Create the time-series collection (with TTL) once per database."""
+    with _ensure_lock:
+        if db.name in _ensured:
+            return
+        try:
+            db.create_collection(
+                SIGHTINGS_COLLECTION,
+                timeseries={"timeField": "ts", "metaField": "meta", "granularity": "seconds"},
+                expireAfterSeconds=SIGHTING_TTL_DAYS * 24 * 3600
+            )
+            db[SIGHTINGS_COLLECTION].create_index([("meta.user_id", 1), ("ts", 1)])
+        except CollectionInvalid:
+            pass  # already exists
+        _ensured.add(db.name)
+
+
+def sighting_doc(user_id, camera_id, ts, distance=None, source="camera", confidence=None):
+    return {
+        "ts": ts,
+        "meta": {"user_id": str(user_id), "camera_id": camera_id or "-", "source": source},
+        "distance": float(distance) if distance is not None else None,
+        "confidence": float(confidence) if confidence is not None else None,
+    }
+
+
+def record_sightings(db, docs):
+    """Insert sighting_doc()s in one unordered batch (the server buckets them by meta)."""
+    if not docs:
+        return
+    ensure_sightings_collection(db)
+    db[SIGHTINGS_COLLECTION].insert_many(docs, ordered=False)
+
+
+def record_sightings_safely(db, docs):
+    """
+    record_sightings() that never raises, for callers whose attendance
+    write must not depend on it. The backlog goes out with `docs`; after a
+    transient failure all of them are kept for the next call. Documents
+    the server rejects individually are dropped, so they cannot block the
+    backlog. Returns True when nothing is left pending.
+    """
+    global _backlog_dropped
+    with _backlog_lock:
+        pending = list(_backlog) + list(docs)
+        _backlog.clear()
+    if not pending:
+        return True
+
+    try:
+        record_sightings(db, pending)
+        return True
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        log.error("sightings_rejected", rejected=len(errors), sent=len(pending),
+                  error=errors[0].get("errmsg") if errors else e,
+                  key="sightings_rejected", every=60)
+        return True
+    except Exception as e:
+        with _backlog_lock:
+            overflow = max(0, len(_backlog) + len(pending) - SIGHTING_BACKLOG_MAX)
+            _backlog_dropped += overflow
+            _backlog.extend(pending)
+            backlog = len(_backlog)
+        log.warning("sightings_deferred", backlog=backlog, dropped=_backlog_dropped, error=e,
+                    key="sightings_deferred", every=30)
+        return False
+
+
+def sighting_backlog():
+    """(sightings waiting to be written, sightings dropped because the backlog was full)."""
+    with _backlog_lock:
+        return len(_backlog), _backlog_dropped
+
+
+# ============================
+# RECOMPUTE
+# ============================
+def _day_start(date_str):
+    return datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=IST)
+
+
+def recompute_attendance(db, date_from, date_to):
+    """
+    Rebuild LBPH attendances for IST dates date_from..date_to (inclusive)
+    by replaying every sighting through the current rules. Days without
+    sightings are left untouched. Returns the number of documents written.
+    """
+    start = _day_start(date_from)
+    end = _day_start(date_to) + timedelta(days=1)
+
+    cursor = db[SIGHTINGS_COLLECTION].find(
+        {"ts": {"$gte": start, "$lt": end}},
+        {"ts": 1, "meta.user_id": 1}
+    ).sort([("meta.user_id", 1), ("ts", 1)])
+
+    days = {}
+    for s in cursor:
+        # pymongo returns naive UTC datetimes unless the client is tz_aware
+        ts = s["ts"].replace(tzinfo=timezone.utc) if s["ts"].tzinfo is None else s["ts"]
+        local = ts.astimezone(IST)
+        key = (s["meta"]["user_id"], local.strftime("%Y-%m-%d"))
+        day = days.setdefault(key, {"entries": [], "first": local})
+        _, entries = apply_attendance_event(day["entries"], local.strftime("%H:%M"))
+        if entries is not None:
+            day["entries"] = entries
+
+    user_ids = {uid for uid, _ in days if ObjectId.is_valid(uid)}
+    institutes = {str(u["_id"]): str(u.get("institute_id", "")) for u in db.users.find(
+        {"_id": {"$in": [ObjectId(u) for u in user_ids]}}, {"institute_id": 1})}
+
+    ops, written = [], 0
+    for (uid, date), day in days.items():
+        ops.append(UpdateOne(
+            {"user_id": uid, "date": date},
+            {"$set": {"entries": day["entries"], "institute_id": institutes.get(uid, ""),
+                      "status": "present", "marked_by": MARKED_BY, "updated_at": datetime.now(IST)},
+             "$setOnInsert": {"created_at": day["first"]}},
+            upsert=True
+        ))
+        if len(ops) >= RECOMPUTE_WRITE_BATCH:
+            db.attendances.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        db.attendances.bulk_write(ops, ordered=False)
+        written += len(ops)
+
+    print(f"[RECOMPUTE] {date_from}..{date_to}: {written} attendance document(s) rebuilt")
+    return written
+
+
+if __name__ == "__main__":
+    from utils.db import get_runtime_db
+
+    parser = argparse.ArgumentParser(description="Rebuild attendances from raw sightings")
+    parser.add_argument("--from", dest="date_from", required=True, help="first date, YYYY-MM-DD (IST)")
+    parser.add_argument("--to", dest="date_to", required=True, help="last date, YYYY-MM-DD (IST)")
+    args = parser.parse_args()
+
+    recompute_attendance(get_runtime_db(), args.date_from, args.date_to)
@@ -0,0 +1,158 @@
+"""
+utils/tracker.py
+----------------
+IoU / centroid face tracker with temporal identity voting.
+
+A track follows one face across frames. Until it has an identity, every
+sighting is run through the recognizer and the (user_id, name) result is
+added to a rolling vote. Once one identity wins `min_votes` of the last
+`vote_window` votes the track is confirmed: no more predictions are made
+for it and attendance is marked exactly once.
+"""
+
+import time
+from collections import Counter, deque
+from itertools import count
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centroid_distance(a, b):
+    ax, ay = a[0] + a[2] / 2, a[1] + a[3] / 2
+    bx, by = b[0] + b[2] / 2, b[1] + b[3] / 2
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5
+
+
+class Track:
+    def __init__(self, track_id, box, now, vote_window, min_votes, recheck_every):
+        self.id = track_id
+        self.box = box
+        self.last_seen = now
+        self.hits = 0
+        self.votes = deque(maxlen=vote_window)
+        self.min_votes = min_votes
+        self.recheck_every = recheck_every
+        self.identity = None      # (user_id, name) once confirmed
+        self.distance = None      # last LBPH distance
+        self.marked = False       # attendance already written for this track
+        self._since_vote = 0
+
+    def needs_prediction(self):
+        """Unconfirmed tracks are predicted every frame until the window fills,
+        then every `recheck_every` frames (e.g. a face that stays Unknown)."""
+        if self.identity is not None:
+            return False
+        if len(self.votes) < self.votes.maxlen:
+            return True
+        return self._since_vote >= self.recheck_every
+
+    def vote(self, identity, distance=None):
+        """identity is (user_id, name) or None for an unknown face."""
+        self.votes.append(identity)
+        self.distance = distance
+        self._since_vote = 0
+
+        winner, n = Counter(self.votes).most_common(1)[0]
+        if winner is not None and n >= self.min_votes:
+            self.identity = winner
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, centroid_ratio=0.5, max_age=1.0,
+                 vote_window=5, min_votes=3, recheck_every=15):
+        self.iou_threshold = iou_threshold
+        self.centroid_ratio = centroid_ratio
+        self.max_age = max_age
+        self.vote_window = vote_window
+        self.min_votes = min_votes
+        self.recheck_every = recheck_every
+
+        self.tracks = []
+        self._ids = count(1)
+        self.created = 0
+
+    def update(self, boxes, now=None):
+        """
+        Match (x, y, w, h) boxes to live tracks; returns one Track per box.
+        Tracks not seen for `max_age` seconds are dropped.
+        """
+        now = time.monotonic() if now is None else now
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+
+        # Candidate pairs: IoU first, centroid distance as a fallback for fast motion
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for bi, box in enumerate(boxes):
+                score = _iou(track.box, box)
+                if score < self.iou_threshold:
+                    limit = self.centroid_ratio * max(track.box[2], track.box[3])
+                    if _centroid_distance(track.box, box) > limit:
+                        continue
+                pairs.append((score, ti, bi))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(boxes)
+        used = set()
+        for _, ti, bi in pairs:
+            if ti in used or assigned[bi] is not None:
+                continue
+            used.add(ti)
+            assigned[bi] = self.tracks[ti]
+
+        for bi, box in enumerate(boxes):
+            track = assigned[bi]
+            if track is None:
+                track = Track(next(self._ids), box, now, self.vote_window,
+                              self.min_votes, self.recheck_every)
+                self.tracks.append(track)
+                assigned[bi] = track
+                self.created += 1
+            track.box = box
+            track.last_seen = now
+            track.hits += 1
+            track._since_vote += 1
+
+        return assigned
+
+    def stats(self):
+        return {
+            "active": len(self.tracks),
+            "created": self.created,
+            "confirmed": sum(1 for t in self.tracks if t.identity is not None),
+        }
+
+
+def assign_identities(tracker, faces, predict, now=None):
+    """
+    Track detector boxes (x, y, w, h, conf) and vote on identities.
+
+    predict(box) -> (user_id, name, distance) is only called for tracks
+    that still need a prediction. Returns (results, events): one
+    (x, y, w, h, user_id, name, distance, track_id) per face, and the
+    (user_id, name, distance) of tracks confirmed on this frame (once per track).
+    """
+    faces = [f for f in faces if f[2] > 0 and f[3] > 0]
+    tracks = tracker.update([f[:4] for f in faces], now)
+
+    results, events = [], []
+    for (x, y, w, h, conf), track in zip(faces, tracks):
+        if track.needs_prediction():
+            uid, name, distance = predict((x, y, w, h))
+            track.vote((uid, name) if uid else None, distance)
+
+        uid, name = track.identity or (None, None)
+        results.append((x, y, w, h, uid, name, track.distance, track.id))
+
+        if track.identity and not track.marked:
+            track.marked = True
+            events.append((*track.identity, track.distance))
+
+    return results, events
@@ -0,0 +1,107 @@
+"""
+utils/user_directory.py
+-----------------------
+In-memory label → user directory for the recognition loop.
+
+labels.pkl maps "name_uid" strings to LBPH label ids. The directory
+parses those once per model and joins them with the users collection
+(name, institute_id, status), so a recognition needs no string parsing,
+no ObjectId construction and no users lookup. A background thread
+re-reads the users every `interval` seconds so status changes (e.g. an
+employee set to Inactive) apply without restarting the loop.
+"""
+
+import threading
+from collections import namedtuple
+
+from bson import ObjectId
+
+from utils.log import get_logger
+
+log = get_logger("directory")
+
+
+class UserEntry(namedtuple("UserEntry", "user_id name institute_id status")):
+    __slots__ = ()
+
+    @property
+    def active(self):
+        # Users never synced from the DB are trusted until the next refresh
+        return self.status is None or str(self.status).lower() == "active"
+
+
+class UserDirectory:
+    def __init__(self, labels):
+        """labels: {"name_uid": label_id} as saved by train_lbph_model()."""
+        self._by_label = {}
+        for full, label in labels.items():
+            name, uid = (full.rsplit("_", 1) + [None])[:2]
+            if uid and ObjectId.is_valid(uid):
+                self._by_label[label] = UserEntry(str(ObjectId(uid)), name, None, None)
+        self._by_user = {e.user_id: e for e in self._by_label.values()}
+
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, label):
+        """UserEntry for an LBPH label id, or None."""
+        return self._by_label.get(label)
+
+    def user(self, user_id):
+        return self._by_user.get(user_id)
+
+    def is_active(self, user_id):
+        entry = self._by_user.get(user_id)
+        return entry is None or entry.active
+
+    def refresh(self, db):
+        """Re-read name / institute / status of every labelled user (one query)."""
+        users = {str(u["_id"]): u for u in db.users.find(
+            {"_id": {"$in": [ObjectId(uid) for uid in self._by_user]}},
+            {"name": 1, "institute_id": 1, "status": 1}
+        )}
+
+        by_label = {}
+        for label, entry in self._by_label.items():
+            u = users.get(entry.user_id)
+            if u is None:
+                by_label[label] = entry._replace(status="Missing")
+                continue
+            by_label[label] = UserEntry(entry.user_id, u.get("name") or entry.name,
+                                        str(u.get("institute_id", "")), u.get("status"))
+
+        # Swap whole dicts so readers on other threads never see a half update
+        self._by_user = {e.user_id: e for e in by_label.values()}
+        self._by_label = by_label
+        self.refreshes += 1
+
+    def start_auto_refresh(self, get_db, interval=60.0):
+        """Refresh now (best effort) and then every `interval` seconds on a daemon thread."""
+        def run():
+            while True:
+                try:
+                    self.refresh(get_db())
+                except Exception as e:
+                    self.refresh_errors += 1
+                    log.warning("refresh_failed", error=e, key="refresh_failed", every=300)
+                if self._stop.wait(interval):
+                    break
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=run, name="user-directory", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        entries = list(self._by_label.values())
+        return {
+            "users": len(entries),
+            "inactive": sum(1 for e in entries if not e.active),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }